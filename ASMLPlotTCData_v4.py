@@ -90,28 +90,13 @@ TCFiles = TCFiles[TCctime_i].tolist()
 
 
                
-IQCFiles = glob.glob( folder + "QICC.*" )
-IQCFileZ = []
-for i,f in enumerate(IQCFiles):
-    if not "tgs" in f:
-        # get rid of the .tgs files in the list
-        IQCFileZ.append(f)
-#print("IQCFIleZ", IQCFileZ )
-
-# filter out files by date.
-IQCctime = [  datetime.datetime.fromtimestamp(  os.path.getctime(f)  ) for f in IQCFileZ]  
-IQCctime_i = numpy.where(numpy.array(IQCctime) >= mindate)[0]
-IQCFileZ = numpy.array(IQCFileZ)
-IQCFileZ = IQCFileZ[IQCctime_i].tolist()
-
-
 #raise UserError()
 
 
 ASML_CT.unset_DEBUG()
 ct = ASML_CT.ASML_CT( TCFiles )   # analyze the files
-iqcdata = ct.add_IQC_files( IQCFileZ )
-ct.iqc_analyze()
+ct.add_IQC_dir( folder, index=True )   # QICC files, only new/changed files are opened (index saved in the folder)
+ct.iqc_analyze()     # plot() only shows IQC data within the date range of the TC data
 
 
 
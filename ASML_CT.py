@@ -34,13 +34,20 @@ import scipy as sp  # SciPy (signal and image processing library)
 
 import matplotlib as mpl         # Matplotlib (2D/3D plotting library)
 import matplotlib.pyplot as plt  # Matplotlib's pyplot: MATLAB-like syntax
+import matplotlib.figure         # standalone Figures, without pyplot
 #from pylab import *              # Matplotlib's pylab interface
 #plt.ion()                            # Turned on Matplotlib's interactive mode
 
 ####################################################
 
 import time     # for getting current date
+import os       # file listing
+import re       # RegEx matching
 import datetime # for converting string date/times
+import io       # text streams of compressed data
+import gzip, bz2, lzma, zipfile, tarfile   # compressed files & archives
+import contextlib
+import concurrent.futures   # parallel parsing
 #import os
 #import csv
 import pandas as pd  # Data/database Manipulation
@@ -71,15 +78,323 @@ def unset_DEBUG():
 ####################################################
 
 
+# CT data columns & units
+CT_COLUMNS = ["Tlens",  "Twater", "Tair",   "Tws",    "Ttcu",   "Ftcu",   "Tact",   "Pairin", "Pgas",    "Plens",  "Flens", "Cont", "Hum"]
+CT_UNITS =   ["°C",     "°C",     "°C",     "°C",     "°C",     "l/min",  "°C",   "Pascal", "bar x 10^5","bar x 10^5","l/hr", "",   "%"]
+
+# IQC data columns
+IQC_COLUMNS = ["DateTime","IQCfoc","IQCfocMC"]
+
+# QICC data file names, eg. "QICC.32", or "QICC.32.<suffix>" from DataGrove, but not the *tgs* files
+QICC_PATTERN = re.compile( r"^QICC\.(?!.*tgs)\d+(\..*)?$" )
+
+# CT log file names, eg. "CTlogM8477.cur" or "CTlogM8477 2021-03-17 1300.old", use with .search()
+CT_PATTERN = re.compile( r"\.(cur|old)" )
+
+
+####################################################
+# Compressed files & archives
+
+# Separates an archive path from a member name, eg. "CT logs 2020.zip::CTlogM8477 2020-12-01 0800.old"
+ARCHIVE_SEP = "::"
+
+# single compressed files, decompressed while reading
+DECOMPRESSORS = { ".gz": lambda f: gzip.GzipFile(fileobj=f), ".bz2": bz2.BZ2File, ".xz": lzma.LZMAFile }
+
+TAR_PATTERN = re.compile( r"\.(tar|tgz|tbz2?|txz|tar\.(gz|bz2|xz))$", re.IGNORECASE )
+ZIP_PATTERN = re.compile( r"\.zip$", re.IGNORECASE )
+
+
+def _decompress(fileobj, name):
+    """ Wrap a binary file object with a streaming decompressor, if `name` is a .gz/.bz2/.xz file."""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in DECOMPRESSORS: return DECOMPRESSORS[ext](fileobj)
+    return fileobj
+#end _decompress()
+
+
+@contextlib.contextmanager
+def open_text(path):
+    """
+    Open a data file for reading text, like `open(path, "r")`, decompressing while reading.
+    `path` can be a plain file, a .gz/.bz2/.xz compressed file, 
+    or a member of a .zip/.tar archive as "archive.zip::member" (see ARCHIVE_SEP).
+    Nothing is extracted to disk, and only a small buffer is held in memory.
+    """
+    with contextlib.ExitStack() as stack:
+        if ARCHIVE_SEP in path:
+            archive, member = path.split(ARCHIVE_SEP, 1)
+            if ZIP_PATTERN.search(archive):
+                raw = stack.enter_context( stack.enter_context( zipfile.ZipFile(archive) ).open(member) )
+            else:
+                raw = stack.enter_context( tarfile.open(archive, "r:*") ).extractfile(member)
+                if raw is None: raise ValueError("Not a file in archive: `%s`"%(path))
+                stack.enter_context(raw)
+            raw = stack.enter_context( _decompress(raw, member) )
+        elif os.path.splitext(path)[1].lower() in DECOMPRESSORS:
+            raw = stack.enter_context( _decompress( stack.enter_context(open(path, "rb")), path ) )
+        else:
+            yield stack.enter_context( open(path, "r") )
+            return
+        yield io.TextIOWrapper(raw)
+    #end with(stack)
+#end open_text()
+
+
+def zip_members(path, pattern=None):
+    """ Return the names of the files in a zip archive, optionally only those whose file name matches `pattern.search()`."""
+    with zipfile.ZipFile(path) as z:
+        return [ info.filename  for info in z.infolist()
+            if not info.is_dir() and ( not pattern or pattern.search( os.path.basename(info.filename) ) ) ]
+#end zip_members()
+
+
+def iter_zip(path, members):
+    """
+    Yield (name, text stream) for the given members of a zip archive, named "archive::member".
+    The archive is opened once, so its central directory is only read once for all members.
+    """
+    with zipfile.ZipFile(path) as z:
+        for member in members:
+            with z.open(member) as raw, _decompress(raw, member) as raw:
+                yield path + ARCHIVE_SEP + member, io.TextIOWrapper(raw)
+#end iter_zip()
+
+
+def iter_members(path, pattern=None):
+    """
+    Iterate over the data files in a path, yielding (name, text stream) pairs.
+    A plain or compressed file yields itself, an archive yields each member as "archive::member".
+    Tar archives are read sequentially in a single pass, so compressed tar files are only decompressed once.
+    
+    Parameters
+    ----------
+    path : string
+        File, compressed file, archive or archive member (see `open_text()`).
+    
+    pattern : compiled RegEx, optional
+        Only yield archive members whose file name matches `pattern.search()`.
+    """
+    if (ARCHIVE_SEP in path) or not ( TAR_PATTERN.search(path) or ZIP_PATTERN.search(path) ):
+        with open_text(path) as f:
+            yield path, f
+    elif ZIP_PATTERN.search(path):
+        yield from iter_zip( path, zip_members(path, pattern) )
+    else:
+        with tarfile.open(path, "r:*") as t:     # members in order, so a compressed tar is only read forward
+            for member in t:
+                if not member.isfile(): continue
+                if pattern and not pattern.search( os.path.basename(member.name) ): continue
+                with t.extractfile(member) as raw, _decompress(raw, member.name) as raw:
+                    yield path + ARCHIVE_SEP + member.name, io.TextIOWrapper(raw)
+    #end if(archive)
+#end iter_members()
+
+
+def _parse_unit(kind, unit, pattern):
+    """
+    Parse all data files of one unit of work in a worker process, returning [(name, result), ...].
+    `unit` is a path (see `iter_members()`), or a (zip path, [members]) tuple.
+    """
+    parse = parse_ct_file if kind == "CT" else parse_iqc_file
+    streams = iter_zip(*unit) if isinstance(unit, tuple) else iter_members(unit, pattern)
+    return [ (name, parse(name, stream=f))  for name, f in streams ]
+#end _parse_unit()
+
+
+def parse_many(kind, paths, workers=None, pattern=None):
+    """
+    Parse CT (`kind="CT"`) or QICC (`kind="IQC"`) data files, compressed files and archives, in parallel processes.
+    The members of a zip archive are split into one contiguous slice per worker, and each worker opens 
+    the archive once for its slice. Tar archives are parsed one per process (they can only be read sequentially).
+    
+    Parameters
+    ----------
+    paths : list of strings
+        Paths of files, compressed files or archives.
+    
+    workers : int, optional
+        Number of worker processes, defaults to None which uses the number of CPUs.
+    
+    pattern : compiled RegEx, optional
+        Only parse archive members whose file name matches, eg. QICC_PATTERN.
+    
+    Returns
+    -------
+    List of (name, result) in the order of `paths`, with `result` as returned by `parse_ct_file()` or `parse_iqc_file()`.
+    Archive members are named "archive::member".
+    """
+    if workers is None: workers = os.cpu_count() or 1
+    
+    units = []
+    for path in paths:
+        if ZIP_PATTERN.search(path) and not ARCHIVE_SEP in path:
+            members = zip_members(path, pattern)
+            if not members: continue    # no data files in this archive
+            step = -(-len(members) // workers)    # ceil, one slice per worker
+            units.extend(  (path, members[i:i+step])  for i in range(0, len(members), step)  )
+        else:
+            units.append(path)
+    #end for(paths)
+    
+    # several plain files per task, to limit the per-task overhead for many small files
+    chunksize = max( 1, len(units) // (4*workers) )
+    with concurrent.futures.ProcessPoolExecutor( workers ) as pool:
+        chunks = pool.map(  _parse_unit, [kind]*len(units), units, [pattern]*len(units), chunksize=chunksize  )
+        return [ item  for chunk in chunks  for item in chunk ]
+#end parse_many()
+
+####################################################
+
+
+
+def parse_ct_file(curfile, CurDate=datetime.date(2020,1,1), stream=None):
+    """
+    Parse a single CT log file.
+    Module-level function, so it can be run in a worker process.
+    
+    Parameters
+    ----------
+    curfile : string
+        Path to the CT file. May be compressed or an archive member, see `open_text()`.
+    
+    CurDate : datetime.date, optional
+        Date to use for data lines found before the first date header in the file.
+    
+    stream : text file object, optional
+        Already opened stream to read, instead of opening `curfile`.
+    
+    Returns
+    -------
+    (Data, Dates, CurDate) : Data is a list of rows [DateTime, Tlens, Twater, ...], 
+        Dates is a list of the dates found in the file headers, 
+        CurDate is the last date found (to continue parsing with the next file).
+    """
+    ## Data:
+    # 00:01:55 22.007 21.999 18.849 22.023 22.080 42.87  22.070 1067   796026  101985 6.16   off    0  
+    Data = []
+    Dates = []
+    CurTime = datetime.time(0,0,0)
+    if DEBUG(): print("opening file:", curfile)
+    line=True
+    with ( open_text(curfile) if stream is None else contextlib.nullcontext(stream) ) as f:
+        while line:
+            line = f.readline()
+            if not line: 
+                if DEBUG(): print("Done with file:", curfile)
+                break  # end when EOF (blank string returned)
+            #print(line)
+            try: 
+                #print("trying: float(%s)" % str( line.strip()[0:2] ) )
+                float( line.strip()[0:2] ) # test if next data starts with a number
+            except ValueError:
+                # line is not nnumeric, get the Date
+                if line.strip() == "Initialize":
+                    f.readline() # the machine number - discard
+                    line = f.readline()
+                    FullLine = line  # store for debugging only
+                # Get the date; date format:
+                # TUE MAR 09 13:08:26 2021
+                line = line[4:-1]   # strip the 4 character day of week
+                #print("Date: `%s`" % line);
+                try:
+                    dateobj = datetime.datetime.strptime( line, '%b %d %H:%M:%S %Y')
+                except ValueError:
+                    print("**>> Failed DateTime parsing on File: `%s`\n"%curfile, "FullLine read was:\n\t%s\n"%FullLine, "Parsed Line was:\n\t%s"%line)
+                CurDate = dateobj.date()
+                Dates.append(CurDate)
+                if DEBUG(): print("\t Found CT date+time:", dateobj, "\t Adding Date: ", Dates[-1])
+                for i in range(3):
+                    line=f.readline()    # skip next three lines
+                    #print("skipping line:", line)
+                line = f.readline()
+            #end try( numeric )
+            
+            if not line: break  # end when EOF (blank string returned)
+            
+            # Parse the data line:
+            CurTime = datetime.datetime.strptime( line[0:8], '%H:%M:%S').time()
+            
+            Tlens,  Twater, Tair,   Tws,    Ttcu,   Ftcu,   Tact,   Pairin, Pgas,    Plens,  Flens, Cont, Hum = \
+                float(line[9:15]), float(line[16:22]), float(line[23:29]), float(line[30:36]), float(line[37:43]), \
+                float(line[44:49]), float(line[51:57]), float(line[58:62]), float(line[65:71]), float(line[73:79]), \
+                float(line[80:84]), line[87:91], line[94:95]
+            Data.append(  [datetime.datetime.combine(CurDate, CurTime), Tlens,  Twater, Tair,   Tws,    Ttcu,   Ftcu,   Tact,   Pairin, Pgas,    Plens,  Flens, Cont, Hum]  )
+        #end while(line) - ends at EOF
+    #end with(file)
+    
+    return Data, Dates, CurDate
+#end parse_ct_file()
+
+
+def parse_iqc_file(curfile, stream=None):
+    """
+    Parse a single QICC file, for the IQC Focus Correction and Date/Time of measurement.
+    Module-level function, so it can be run in a worker process.
+    
+    Parameters
+    ----------
+    curfile : string
+        Path to the QICC file. May be compressed or an archive member, see `open_text()`.
+    
+    stream : text file object, optional
+        Already opened stream to read, instead of opening `curfile`.
+    
+    Returns
+    -------
+    [DateTime, IQCfoc, IQCfocMC] list, or None if the file could not be parsed.
+    """
+    ## Parse each file
+    # Line, Col, length within the text file
+    datepat = [1,54,10]  
+    timepat = [1,71,5]
+    focpat =  [37,40,9]   # IQC Focus Mean Correction:
+    focmc = [37,29,9]     # abs machine constant for focus
+    
+    AllLines=[]
+    line=True
+    with ( open_text(curfile) if stream is None else contextlib.nullcontext(stream) ) as f:
+        while line:
+            line = f.readline()
+            if not line: 
+                if DEBUG(): print("Done with file:", curfile)
+                break  # end when EOF
+            AllLines.append( line + "\n" )
+        #end while(file)
+    #end with(curfile)
+    
+    DateStr = AllLines[ datepat[0] ][ datepat[1]:datepat[1]+datepat[2] ]
+    #print(DateStr)
+    TimeStr = AllLines[ timepat[0] ][ timepat[1]:timepat[1]+timepat[2] ]
+    #print(TimeStr)
+    dateobj = datetime.datetime.strptime( DateStr+" "+TimeStr, '%m/%d/%Y %H:%M')
+    try:
+        IQCfoc = float( AllLines[ focpat[0] ][ focpat[1]:focpat[1]+focpat[2] ] )
+        MCfoc = float( AllLines[ focpat[0] ][ focmc[1]:focmc[1]+focmc[2] ] )
+    except:
+        print("*** Error while parsing IQC file: `" + curfile +"`\n\t File Skipped.")
+        #raise #raise the original exception again.
+        return None
+    if DEBUG(): print(dateobj, "\t", IQCfoc)
+    
+    return [dateobj, IQCfoc, MCfoc]
+#end parse_iqc_file()
+
+####################################################
+
+
 class ASML_CT:
     """
     Analyze CT log files from ASML files system. Data is sorted by date & time.
     
-    ASML_CT( files=[],  return_dataframe=True )
+    ASML_CT( files=[],  return_dataframe=True, workers=1 )
     
     Arguments
     ---------
     files: List of file paths (strings). 
+        Files may be compressed (.gz/.bz2/.xz) or .zip/.tar archives of CT files, which are read without extracting them.
+    workers : int, defaults to 1
+        Number of processes parsing files & archive members, None uses the number of CPUs.
     return_dataframe : {True | False}, defaults to True
         Return the combined, sorted dataframe
     
@@ -89,16 +404,19 @@ class ASML_CT:
     Examples
     --------
     ASML_CT( ["/path/to/my/file/CTlogM8477 2021-03-17 1300.old",  "CTlogM8477.cur"] )
+    ASML_CT( ["CT logs 2020.tar.gz", "CTlogM8477 2021-01-04 0900.old.gz"], workers=4 )
     ASML_CT.plot()
     DataFrame = ASML_CT.df   # do your own analysis with Pandas
     """
     
     
     
-    def __init__(self, files=[] ):
+    def __init__(self, files=[], workers=1 ):
         """ see help(ASML_TCU) for constructor info"""
-        self.files = files
+        self.files = list(files)
+        self.workers = workers
         self.Dates = []
+        self.data_version = 0   # incremented whenever df, iqcdata or spc change, eg. for caching
         # self.iqc = None;  Unused?
         self.df =  self.analyze()
         self.iqc_files = []
@@ -112,85 +430,72 @@ class ASML_CT:
         
         ## Headers:
         # time     Tlens  Twater Tair   Tws    Ttcu   Ftcu   Tact   Pairin Pgas    Plens  Flens  Cont   Hum s   
-        self.columns=["Tlens",  "Twater", "Tair",   "Tws",    "Ttcu",   "Ftcu",   "Tact",   "Pairin", "Pgas",    "Plens",  "Flens", "Cont", "Hum"]
-        self.units = ["°C",     "°C",     "°C",     "°C",     "°C",     "l/min",  "°C",   "Pascal", "bar x 10^5","bar x 10^5","l/hr", "",   "%"]
-        ## Data:
-        # 00:01:55 22.007 21.999 18.849 22.023 22.080 42.87  22.070 1067   796026  101985 6.16   off    0  
-        
-        
-        
-        Data = []
-        #self.Dates = []
-        CurDate = datetime.date(2020,1,1) # initialize variable with arbitrary date/time
-        CurTime = datetime.time(0,0,0)
-        for curfile in self.files:
-            if DEBUG(): print("opening file:", curfile)
-            line=True
-            with open(curfile, "rU") as f:
-                while line:
-                    line = f.readline()
-                    if not line: 
-                        if DEBUG(): print("Done with file:", curfile)
-                        break  # end when EOF (blank string returned)
-                    #print(line)
-                    try: 
-                        #print("trying: float(%s)" % str( line.strip()[0:2] ) )
-                        float( line.strip()[0:2] ) # test if next data starts with a number
-                    except ValueError:
-                        # line is not nnumeric, get the Date
-                        if line.strip() == "Initialize":
-                            f.readline() # the machine number - discard
-                            line = f.readline()
-                            FullLine = line  # store for debugging only
-                        # Get the date; date format:
-                        # TUE MAR 09 13:08:26 2021
-                        line = line[4:-1]   # strip the 4 character day of week
-                        #print("Date: `%s`" % line);
-                        try:
-                            dateobj = datetime.datetime.strptime( line, '%b %d %H:%M:%S %Y')
-                        except ValueError:
-                            print("**>> Failed DateTime parsing on File: `%s`\n"%curfile, "FullLine read was:\n\t%s\n"%FullLine, "Parsed Line was:\n\t%s"%line)
-                        CurDate = dateobj.date()
-                        self.Dates.append(CurDate)
-                        if DEBUG(): print("\t Found CT date+time:", dateobj, "\t Adding Date: ", self.Dates[-1])
-                        for i in range(3):
-                            line=f.readline()    # skip next three lines
-                            #print("skipping line:", line)
-                        line = f.readline()
-                    #end try( numeric )
-                    
-                    if not line: break  # end when EOF (blank string returned)
-                    
-                    # Parse the data line:
-                    CurTime = datetime.datetime.strptime( line[0:8], '%H:%M:%S').time()
-                    
-                    Tlens,  Twater, Tair,   Tws,    Ttcu,   Ftcu,   Tact,   Pairin, Pgas,    Plens,  Flens, Cont, Hum = \
-                        float(line[9:15]), float(line[16:22]), float(line[23:29]), float(line[30:36]), float(line[37:43]), \
-                        float(line[44:49]), float(line[51:57]), float(line[58:62]), float(line[65:71]), float(line[73:79]), \
-                        float(line[80:84]), line[87:91], line[94:95]
-                    Data.append(  [datetime.datetime.combine(CurDate, CurTime), Tlens,  Twater, Tair,   Tws,    Ttcu,   Ftcu,   Tact,   Pairin, Pgas,    Plens,  Flens, Cont, Hum]  )
-                    #print("CurTime = ", CurTime)
-                    #print( Tlens,  Twater, Tair,   Tws,    Ttcu,   Ftcu,   Tact,   Pairin, Pgas,    Plens,  Flens, Cont, Hum)
-                    
-                    
-                    #end if(first data Frame)
-                    
-                    
-                  #x, y = line[:28], line[29:]
-                #end while(line) - ends at EOF
-            #end with(file)
-        #end for(files)
-        
-        
-        df = pd.DataFrame(  Data, columns=["DateTime", *self.columns]  )
+        self.columns = CT_COLUMNS
+        self.units = CT_UNITS
+        
+        self._ct_frames = {}    # per-file DataFrames, so single files can be re-parsed later
+        self._ct_dates = {}     # per-file header dates, rebuilt into ASML_CT.Dates
+        if self.workers == 1:
+            CurDate = datetime.date(2020,1,1) # initialize variable with arbitrary date/time
+            for path in self.files:
+                for curfile, f in iter_members(path, CT_PATTERN):
+                    Data, Dates, CurDate = parse_ct_file(curfile, CurDate, stream=f)
+                    self._ct_dates[curfile] = Dates
+                    self._ct_frames[curfile] = pd.DataFrame(  Data, columns=["DateTime", *self.columns]  )
+            #end for(files)
+        else:
+            # each file starts from the default date, instead of the last date of the previous file.
+            for curfile, (Data, Dates, CurDate) in parse_many("CT", self.files, self.workers, CT_PATTERN):
+                self._ct_dates[curfile] = Dates
+                self._ct_frames[curfile] = pd.DataFrame(  Data, columns=["DateTime", *self.columns]  )
+        #end if(workers)
+        
+        return self._merge_ct()
+    #end analyze()
+    
+    
+    def update_CT_data(self, results):
+        """
+        Incrementally add or replace the data of individual CT files, without re-parsing the others.
+        
+        Parameters
+        ----------
+        results : dictionary
+            { filepath : (Data, Dates) }, as returned by `parse_ct_file()` for each new or changed file.
+            A file that was loaded previously has its old rows replaced.
+        
+        Returns
+        -------
+        The combined, sorted DataFrame (also stored in ASML_CT.df).
+        """
+        for curfile, (Data, Dates) in results.items():
+            if not curfile in self._ct_frames:
+                self.files.append(curfile)
+            self._ct_frames[curfile] = pd.DataFrame(  Data, columns=["DateTime", *self.columns]  )
+            self._ct_dates[curfile] = Dates    # replaces the dates of a re-parsed file
+        #end for(results)
+        
+        return self._merge_ct()
+    #end update_CT_data()
+    
+    
+    def _merge_ct(self):
+        """ Combine the per-file CT DataFrames into ASML_CT.df/ASML_CT.data, sorted by DateTime, and the per-file dates into ASML_CT.Dates."""
+        self.Dates = [ d  for curfile in self._ct_frames  for d in self._ct_dates.get(curfile, []) ]
+        if self._ct_frames:
+            df = pd.concat( list(self._ct_frames.values()), ignore_index=True )
+        else:
+            df = pd.DataFrame(  [], columns=["DateTime", *self.columns]  )
         df = df.sort_values("DateTime")
         
         self.data = df
+        self.df = df
+        self.data_version += 1
         return self.data
-    #end analyze()
+    #end _merge_ct()
     
     
-    def plot(  self, SaveFig=False, prefix="", data=None, IQCdata=None, PlotTemperature=True, PlotPressure=False, PlotSupplyGas=False, PlotTCU=False, PlotFocCorrection=True, PlotFocMC=False, WS_ymin=None, WS_ymax=None, ax1args=dict(), ax2args=dict(), ax3args=dict(),  figargs=dict()  ):
+    def plot(  self, SaveFig=False, prefix="", data=None, IQCdata=None, PlotTemperature=True, PlotPressure=False, PlotSupplyGas=False, PlotTCU=False, PlotFocCorrection=True, PlotFocMC=False, WS_ymin=None, WS_ymax=None, ax1args=dict(), ax2args=dict(), ax3args=dict(),  figargs=dict(), SPC=None, show=True  ):
         """
         Plot the temperature data. If IQC data has been analyzed, plot that as well.
         Multiple MatPLotLib Axes objects are plotted as so:
@@ -246,6 +551,15 @@ class ASML_CT:
         figargs, ax1args, ax2args, ax3args : Dictionary
             Dictionary of arguments to pass to the plot commands of the Matplotlib.pyplot.subplots() command, and ax1/ax2/ax3.plot() commands, respectively.
         
+        SPC : pandas.DataFrame or True, defaults to None
+            Overlay Statistical Process Control results on the IQC plot: control limits, EWMA and alarms.
+            Pass the table returned by `ASML_CT.iqc_spc()`, or True to use ASML_CT.spc from the last `ASML_CT.iqc_spc()`.
+            Plotting only reads the SPC results, it does not update them.
+        
+        show : {True|False}, defaults to True
+            Show the figure with pyplot. False creates a standalone Matplotlib Figure that is not managed by pyplot 
+            (no GUI window, safe to render in background threads), eg. for ASML_Watch & ASML_Server.
+        
         Returns
         -------
         Fig : Matplotlib Figure object containing the Axis objects.
@@ -272,17 +586,25 @@ class ASML_CT:
         #end if(IQCdata)
         
         
+        def subplots(nrows):
+            """ pyplot.subplots(), or a standalone Figure if not showing the plot."""
+            if show: return plt.subplots(nrows=nrows, ncols=1, sharex=True, **figargs)
+            figkw = { k: figargs[k]  for k in ("figsize", "dpi", "facecolor", "edgecolor", "layout")  if k in figargs }
+            fig = matplotlib.figure.Figure( **figkw )
+            return fig, fig.subplots( nrows=nrows, ncols=1, sharex=True, **{ k: v  for k, v in figargs.items()  if not k in figkw } )
+        #end subplots()
+        
         # ax1+ax2 is temperature data, ax3 is IQC data, ax4 is Pressure data
         if (not iqcplot) and (not PlotPressure):
-            fig, [ax1, ax2] = plt.subplots(nrows=2, ncols=1, sharex=True, **figargs)
+            fig, [ax1, ax2] = subplots(2)
         elif (iqcplot) and (not PlotPressure):
-            fig, [ax2, ax1, ax3] = plt.subplots(nrows=3, ncols=1, sharex=True, **figargs)
+            fig, [ax2, ax1, ax3] = subplots(3)
         elif (not iqcplot) and (PlotPressure):
-            fig, [ax2, ax1, ax4] = plt.subplots(nrows=3, ncols=1, sharex=True, **figargs)
+            fig, [ax2, ax1, ax4] = subplots(3)
         elif (iqcplot) and (PlotPressure) and not PlotSupplyGas:
-            fig, [ax2, ax1, ax3, ax4, ax5] = plt.subplots(nrows=5, ncols=1, sharex=True, **figargs)
+            fig, [ax2, ax1, ax3, ax4, ax5] = subplots(5)
         elif (iqcplot) and (PlotPressure) and PlotSupplyGas:
-            fig, [ax2, ax1, ax3, ax4, ax5, ax6] = plt.subplots(nrows=6, ncols=1, sharex=True, **figargs)
+            fig, [ax2, ax1, ax3, ax4, ax5, ax6] = subplots(6)
         #end if(which plots)
         
         
@@ -364,6 +686,17 @@ class ASML_CT:
                     #    tl.set_color('blue')       # tick labels - eg. 1, 2, 3 etc.
             #end PlotFocCorrection
             
+            # SPC overlay: control limits, EWMA and alarm points
+            if isinstance(SPC, bool): SPC = getattr(self, "spc", None) if SPC else None
+            if not isinstance(SPC, type(None)):
+                spcdata = SPC[  SPC.DateTime.between(tempmin, tempmax, inclusive="both")  ]
+                ax3.step(   spcdata["DateTime"], spcdata["UCL"], where="post", linestyle="--", color="grey", label="Control Limits"   )
+                ax3.step(   spcdata["DateTime"], spcdata["LCL"], where="post", linestyle="--", color="grey"   )
+                ax3.plot(   spcdata["DateTime"], spcdata["EWMA"], label="EWMA", color="orange"   )
+                alarms = spcdata[ spcdata["Alarm"] ]
+                ax3.plot(   alarms["DateTime"], alarms["IQCfoc"], label="SPC Alarm", linestyle="none", marker="o", markersize=10, markerfacecolor="none", markeredgecolor="red"   )
+            #end if(SPC)
+            
             
             # shade acceptable IQC range
             # Create rectangle x coordinates
@@ -427,7 +760,7 @@ class ASML_CT:
         
         #df.plot(x="DateTime", y=["Tair", "Tws", "Tlens"] )
         fig.tight_layout()
-        plt.show()
+        if show: plt.show()
         
         if SaveFig: 
             TodayDate = time.strftime("%Y-%m-%d %H.%M.%S")           # Get current date and time as string
@@ -438,7 +771,7 @@ class ASML_CT:
     #end plot()
 
     
-    def add_IQC_dir(self, folder="/path/to/QICC/Data" ):
+    def add_IQC_dir(self, folder="/path/to/QICC/Data", index=None ):
         """
         Add IQC/QICC data, from QICC files in a folder.  
         Pass a string that is the path to the folder.
@@ -448,39 +781,31 @@ class ASML_CT:
         ----------
         dir : string
             Path to the directory containing QICC data files. 
+        
+        index : {None | True | string}, defaults to None
+            Keep a persistent index of the QICC files (see help(ASML_IQCIndex)), so that `iqc_analyze()` 
+            only opens files that are new or changed since the last run.
+            True stores the index in the QICC folder, a string is the path of the index file.
 
         Returns
         -------
         None.
 
         """
-        
-        
-        #import sys, os, os.path         # OS-specific path manipulations, sys.exit(), terminal interaction (stout etc.)
-        import glob     # filename matching etc.
-        #import re       # RegEx matching
-        #import pandas as pd   # Database module
-        import datetime    # date+time objects
-        
-        Fol = folder
         self.iqc_folder = folder
         
-        if not folder[-1] == "/":
-            folder = folder + "/"
-        
-        AllFiles = glob.glob( Fol + "*" )    # find paths to each text file
-        
-        #print(AllFiles)
-        
-        
-        # Find file extensions with numbers, eg. "QICC.32"
-        DataFiles=[]
-        for f in AllFiles:
-            #print( f[-4: ] )
-            if  f[-2: ].isdecimal():
-                # add only filenames ending in numbers
-                DataFiles.append(f)
-        #end for(AllFiles)
+        if index:
+            import ASML_IQCIndex
+            idx = ASML_IQCIndex.ASML_IQCIndex( folder, indexfile=None if index is True else index )
+            idx.update()
+            if not hasattr(self, "iqc_indexes"): self.iqc_indexes = []
+            self.iqc_indexes.append(idx)
+            DataFiles = sorted( idx.rows() )
+        else:
+            # Find QICC files, eg. "QICC.32"
+            with os.scandir(folder) as it:
+                DataFiles = sorted( entry.path  for entry in it  if QICC_PATTERN.match(entry.name) and entry.is_file() )
+        #end if(index)
         
         #print(DataFiles)
         
@@ -498,6 +823,7 @@ class ASML_CT:
         ----------
         FilePaths : string, or iterable containing strings
             List of string Paths to the QICC data file(s). 
+            Files may be compressed (.gz/.bz2/.xz) or .zip/.tar archives, whose QICC members are read without extracting them.
 
         Returns
         -------
@@ -514,16 +840,19 @@ class ASML_CT:
     #edn add_IQC_files()
         
         
-    def iqc_analyze(self):
+    def iqc_analyze(self, workers=None):
         '''
         Analyzes QICC data files to extract measured IQC Focus Correction, and Date/Time of measurement.
         IQC data points and plots will be added to the asml_ct object.
 
         Parameters
         ----------
-        No arguments, uses internal variables set by
+        Uses internal variables set by
         ASML_TC.iqc_addfolder(), or
         ASML_TC.iqc_add_files()
+        
+        workers : int, optional
+            Number of processes parsing the files, defaults to the `workers` given to ASML_CT().
 
         Returns
         -------
@@ -532,53 +861,92 @@ class ASML_CT:
         
         DataFiles = self.iqc_files
         
-        ## Parse each file
-        # Line, Col, length within the text file
-        datepat = [1,54,10]  
-        timepat = [1,71,5]
-        focpat =  [37,40,9]   # IQC Focus Mean Correction:
-        focmc = [37,29,9]     # abs machine constant for focus
+        # files already parsed in an index, from `add_IQC_dir(index=True)`
+        indexed = {}
+        for idx in getattr(self, "iqc_indexes", []):
+            indexed.update( idx.rows() )
         
-        # IQC
-        
-        df = pd.DataFrame( columns=["DateTime","IQCfoc","IQCfocMC"] )
+        self._iqc_rows = {}    # per-file results, so single files can be re-parsed later
+        todo = []
         for curfile in DataFiles:
-            AllLines=[]
-            line=True
-            with open(curfile, "r") as f:
-                while line:
-                    line = f.readline()
-                    if not line: 
-                        if DEBUG(): print("Done with file:", curfile)
-                        break  # end when EOF
-                    AllLines.append( line + "\n" )
-                #end while(file)
-            #end with(curfile)
-            
-            DateStr = AllLines[ datepat[0] ][ datepat[1]:datepat[1]+datepat[2] ]
-            #print(DateStr)
-            TimeStr = AllLines[ timepat[0] ][ timepat[1]:timepat[1]+timepat[2] ]
-            #print(TimeStr)
-            dateobj = datetime.datetime.strptime( DateStr+" "+TimeStr, '%m/%d/%Y %H:%M')
-            try:
-                FileOk = True
-                IQCfoc = float( AllLines[ focpat[0] ][ focpat[1]:focpat[1]+focpat[2] ] )
-                MCfoc = float( AllLines[ focpat[0] ][ focmc[1]:focmc[1]+focmc[2] ] )
-            except:
-                print("*** Error while parsing IQC file: `" + curfile +"`\n\t File Skipped.")
-                #raise #raise the original exception again.
-                FileOk = False
-            if DEBUG(): print(dateobj, "\t", IQCfoc)
-            
-            
-            # add data to the end of DataFrame
-            if FileOk: 
-                df.loc[ len(df) ] = [dateobj, IQCfoc, MCfoc]
-            
+            if curfile in indexed:
+                self._iqc_rows[curfile] = indexed[curfile]
+            else:
+                todo.append(curfile)
         #end for(DataFiles)
-        self.iqcdata = df
+        
+        # parse the other files, compressed files & archive members
+        if workers is None: workers = self.workers
+        if workers == 1:
+            for path in todo:
+                for curfile, f in iter_members(path, QICC_PATTERN):
+                    self._iqc_rows[curfile] = parse_iqc_file(curfile, stream=f)
+        else:
+            for curfile, row in parse_many("IQC", todo, workers, QICC_PATTERN):
+                self._iqc_rows[curfile] = row
+        #end if(workers)
+        
+        return self._merge_iqc()
+    #end iqc_analyze()
+    
+    
+    def update_IQC_data(self, results):
+        """
+        Incrementally add or replace the data of individual QICC files, without re-parsing the others.
+        
+        Parameters
+        ----------
+        results : dictionary
+            { filepath : row }, where row is the output of `parse_iqc_file()` for each new or changed file.
+        
+        Returns
+        -------
+        The IQC DataFrame (also stored in ASML_CT.iqcdata).
+        """
+        if not hasattr(self, "_iqc_rows"): self._iqc_rows = {}
+        for curfile, row in results.items():
+            if not curfile in self._iqc_rows:
+                self.iqc_files.append(curfile)
+            self._iqc_rows[curfile] = row
+        #end for(results)
+        
+        return self._merge_iqc()
+    #end update_IQC_data()
+    
+    
+    def _merge_iqc(self):
+        """ Combine the per-file IQC results into ASML_CT.iqcdata, skipping files that failed to parse."""
+        rows = [ r for r in self._iqc_rows.values() if r is not None ]
+        self.iqcdata = pd.DataFrame( rows, columns=IQC_COLUMNS )
+        self.data_version += 1
         return self.iqcdata
-    #end add_IQC_dir()
+    #end _merge_iqc()
+    
+    def iqc_spc(self, **kwargs):
+        """
+        Statistical Process Control of the IQC data, see help(ASML_SPC).
+        Only IQC data added since the previous call is computed, so call this again after adding new QICC files.
+        
+        Parameters
+        ----------
+        Optional keyword arguments are passed to ASML_SPC.ASML_SPC(), eg. window=20. 
+        Changing them recomputes the full history.
+        
+        Returns
+        -------
+        DataFrame of SPC results for each IQC measurement, also stored in ASML_CT.spc
+        The ASML_SPC object is kept in ASML_CT.spc_engine, eg. for `ASML_CT.spc_engine.new_alarms()`.
+        Plot them with `ASML_CT.plot(SPC=ASML_CT.spc)`.
+        """
+        import ASML_SPC
+        
+        if kwargs or not hasattr(self, "spc_engine"):
+            self.spc_engine = ASML_SPC.ASML_SPC( **kwargs )
+        self.spc = self.spc_engine.update( self.iqcdata, self.df )
+        # after replacing ASML_CT.spc: plots with the SPC overlay cached by ASML_Server in between are not re-used
+        self.data_version += 1
+        return self.spc
+    #end iqc_spc()
     
     def export_data(self, outfile='', Excel=True, IQCdata=False, CSV=False):
         '''Export all data in the class to a comma-delimited text file, by defualt sorted by date/time.
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Module ASML_IQCIndex
+
+Persistent index of the QICC files in a folder, so each QICC file is only opened & parsed once.
+The index stores (name, size, mtime, DateTime, IQCfoc, IQCfocMC, status) for each file, in a
+journal file (one JSON entry per line) that is appended to as files are parsed.
+On the next run only new or changed files (by size & modification time) are parsed, and an
+interrupted run resumes where it stopped.
+
+Files are listed with `os.scandir()` and filtered with `ASML_CT.QICC_PATTERN`.
+
+Examples
+--------
+    import ASML_IQCIndex
+    idx = ASML_IQCIndex.ASML_IQCIndex( "/path/to/DataGrove logs (CT and ICQ)/" )
+    idx.update()            # parses only new or changed QICC files
+    idx.dataframe()         # the index as a DataFrame
+
+or through ASML_CT:
+    ct.add_IQC_dir( "/path/to/DataGrove logs (CT and ICQ)/", index=True )
+    ct.iqc_analyze()        # uses the indexed values instead of opening the files
+
+
+@author: Demis D. John
+Univ. of California Santa Barbara; Nanofabrication Facility
+"""
+
+####################################################
+# Module setup etc.
+
+import concurrent.futures
+import datetime
+import json
+import os
+
+import pandas as pd
+
+import ASML_CT
+from ASML_CT import DEBUG
+
+####################################################
+
+
+# default index file name, in the QICC folder
+INDEX_FILENAME = ".QICC_index.jsonl"
+
+
+def _parse_entry(path):
+    """
+    Parse one QICC file, in a worker process.
+    Returns (row, error): `row` is the output of ASML_CT.parse_iqc_file(), `error` is None or the error message.
+    """
+    try:
+        row = ASML_CT.parse_iqc_file(path)
+    except Exception as e:
+        return None, repr(e)
+    if row is None: return None, "IQC focus not found"
+    return row, None
+#end _parse_entry()
+
+
+class ASML_IQCIndex:
+    """
+    Persistent index of the QICC files in a folder.
+
+    ASML_IQCIndex( folder, indexfile=None, workers=None )
+
+    Arguments
+    ---------
+    folder : string
+        Path to the directory containing QICC data files.
+
+    indexfile : string, optional
+        Path of the index file, defaults to `.QICC_index.jsonl` in `folder`.
+
+    workers : int, optional
+        Number of processes parsing new files. Defaults to None, parsing in this process.
+
+
+    The index entries are in ASML_IQCIndex.entries, { filename : entry dictionary }.
+    """
+
+    # journal entries written between flushes to disk
+    flushevery = 256
+
+    def __init__(self, folder, indexfile=None, workers=None):
+        """ see help(ASML_IQCIndex) for constructor info"""
+        self.folder = folder
+        self.indexfile = os.path.join(folder, INDEX_FILENAME) if indexfile is None else indexfile
+        self.workers = workers
+        self.load()
+    #end __init__()
+
+
+    def load(self):
+        """ (Re-)load the index file. A partially written last line, eg. from an interrupted run, is ignored."""
+        self.entries = {}
+        self._lines = 0
+        self._dirty = False
+        if not os.path.exists(self.indexfile): return
+
+        with open(self.indexfile, "r") as f:
+            for line in f:
+                self._lines += 1
+                if not line.endswith("\n"): self._dirty = True    # interrupted while writing the last line
+                try:
+                    entry = json.loads(line)
+                    name = entry["name"]
+                except (ValueError, KeyError):
+                    if DEBUG(): print("ASML_IQCIndex: skipping bad index line:", line)
+                    self._dirty = True    # rewrite the file before appending to it
+                    continue
+                # later entries replace earlier ones
+                if entry.get("status") == "deleted":
+                    self.entries.pop(name, None)
+                else:
+                    self.entries[name] = entry
+            #end for(line)
+        #end with(indexfile)
+        if DEBUG(): print("ASML_IQCIndex: loaded %i entries from `%s`"%( len(self.entries), self.indexfile ))
+    #end load()
+
+
+    def scan(self):
+        """ Return { filename : (size, mtime_ns) } of the QICC files in the folder."""
+        files = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not ASML_CT.QICC_PATTERN.match(entry.name): continue
+                try:
+                    if not entry.is_file(): continue
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue    # removed since listing the folder
+                files[entry.name] = (st.st_size, st.st_mtime_ns)
+            #end for(entry)
+        #end with(scandir)
+        return files
+    #end scan()
+
+
+    def update(self):
+        """
+        Scan the folder, parse new or changed QICC files and drop removed files from the index.
+
+        Returns
+        -------
+        Number of files parsed.
+        """
+        files = self.scan()
+        removed = [ name  for name in self.entries  if not name in files ]
+        todo = sorted(
+            name  for name, (size, mtime_ns) in files.items()
+            if not ( name in self.entries and self.entries[name]["size"] == size and self.entries[name]["mtime_ns"] == mtime_ns )
+            )
+        if DEBUG(): print("ASML_IQCIndex: %i files, %i to parse, %i removed."%( len(files), len(todo), len(removed) ))
+        if not (todo or removed): return 0
+
+        if self._dirty: self.compact()
+
+        paths = [ os.path.join(self.folder, name) for name in todo ]
+        with open(self.indexfile, "a") as journal:
+            for name in removed:
+                del self.entries[name]
+                self._write(journal, {"name": name, "status": "deleted"})
+
+            if self.workers and self.workers > 1 and len(paths) > 1:
+                with concurrent.futures.ProcessPoolExecutor( self.workers ) as pool:
+                    results = pool.map( _parse_entry, paths, chunksize=64 )
+                    self._record(journal, todo, files, results)
+            else:
+                self._record(journal, todo, files, map(_parse_entry, paths))
+        #end with(journal)
+
+        # keep the journal from growing with replaced & deleted entries
+        if self._lines > 2*len(self.entries) + 1000: self.compact()
+        return len(todo)
+    #end update()
+
+
+    def _record(self, journal, todo, files, results):
+        """ Add parsed results to the index & journal, as they arrive."""
+        for n, (name, (row, error)) in enumerate( zip(todo, results) ):
+            size, mtime_ns = files[name]
+            entry = {"name": name, "size": size, "mtime_ns": mtime_ns, "DateTime": None, "IQCfoc": None, "IQCfocMC": None}
+            if error is None:
+                entry["DateTime"] = row[0].isoformat()
+                entry["IQCfoc"], entry["IQCfocMC"] = row[1], row[2]
+                entry["status"] = "ok"
+            else:
+                entry["status"] = "error"
+                entry["error"] = error
+            self.entries[name] = entry
+            self._write(journal, entry)
+            if n % self.flushevery == self.flushevery - 1: journal.flush()   # so an interrupted run can resume
+        #end for(results)
+    #end _record()
+
+
+    def _write(self, journal, entry):
+        journal.write( json.dumps(entry) + "\n" )
+        self._lines += 1
+    #end _write()
+
+
+    def compact(self):
+        """ Rewrite the index file with only the current entries."""
+        tmpfile = self.indexfile + ".tmp"
+        with open(tmpfile, "w") as f:
+            for name in sorted(self.entries):
+                f.write( json.dumps(self.entries[name]) + "\n" )
+        os.replace( tmpfile, self.indexfile )
+        self._lines = len(self.entries)
+        self._dirty = False
+    #end compact()
+
+
+    def rows(self):
+        """
+        Return { filepath : [DateTime, IQCfoc, IQCfocMC] } for each indexed file, as ASML_CT.parse_iqc_file() would.
+        Files that could not be parsed give None.
+        """
+        out = {}
+        for name, entry in self.entries.items():
+            path = os.path.join(self.folder, name)
+            if entry["status"] == "ok":
+                out[path] = [ datetime.datetime.fromisoformat(entry["DateTime"]), entry["IQCfoc"], entry["IQCfocMC"] ]
+            else:
+                out[path] = None
+        #end for(entries)
+        return out
+    #end rows()
+
+
+    def dataframe(self):
+        """ Return the index as a DataFrame, with columns path, size, mtime_ns, DateTime, IQCfoc, IQCfocMC, status."""
+        df = pd.DataFrame(
+            [ [os.path.join(self.folder, name), e["size"], e["mtime_ns"], e["DateTime"], e["IQCfoc"], e["IQCfocMC"], e["status"]]  for name, e in self.entries.items() ],
+            columns=["path", "size", "mtime_ns", "DateTime", "IQCfoc", "IQCfocMC", "status"] )
+        df["DateTime"] = pd.to_datetime( df["DateTime"] )
+        return df
+    #end dataframe()
+
+#end class(ASML_IQCIndex)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Module ASML_SPC
+
+Statistical Process Control (SPC) of IQC focus data, eg. `ASML_CT.iqcdata`.
+Computes rolling control limits, Western Electric / Nelson rule violations, EWMA & CUSUM drift,
+and linear trends versus time and CT temperatures, for every IQC measurement.
+All computations are vectorized with NumPy/Pandas, and can be updated incrementally as new QICC
+files arrive, without re-computing the history.
+
+The result is a DataFrame (`ASML_SPC.table`), one row per IQC measurement, which `ASML_CT.plot(SPC=...)` can overlay:
+    DateTime, IQCfoc, IQCfocMC      IQC data
+    CL, Sigma, UCL, LCL, Z          rolling centre line & 3-sigma control limits from the previous `window` points, z-score
+    WE1 .. WE4                      Western Electric rules:  1 point beyond 3 sigma,  2 of 3 beyond 2 sigma,
+                                    4 of 5 beyond 1 sigma,  8 in a row on one side of the centre line
+    Trend6                          Nelson rule: 6 points in a row increasing or decreasing
+    EWMA, EWMA_UCL, EWMA_LCL        Exponentially-Weighted Moving Average and its limits around the centre line (or `target`)
+    CUSUMpos, CUSUMneg              tabular CUSUM (in sigma) of deviations from the centre line (or `target`)
+    Slope, ProjFoc                  rolling linear trend (nm/day), and the focus projected `horizon` days ahead
+                                    (NaN if the trend is not significant)
+    Tlens, Tws, Tair                CT temperatures at the time of the IQC measurement (if CT data is given)
+    dFoc_dTlens, ...                rolling regression slope of focus versus each temperature (nm/°C)
+    EWMAalarm, CUSUMalarm           EWMA / CUSUM out of limits
+    DriftAlarm                      focus still within `limits`, but projected to leave them within `horizon` days
+    OutOfLimits                     focus outside `limits`, eg. ASML_CT.IQClimits
+    Alarm                           any of the above rules or alarms
+
+Examples
+--------
+    ct.iqc_analyze()
+    spc = ct.iqc_spc()                  # uses an ASML_SPC object stored in `ct`
+    print( spc[ spc.Alarm ] )
+    ct.plot( SPC=spc )
+
+    # or directly, updating as new QICC data arrives:
+    import ASML_SPC
+    s = ASML_SPC.ASML_SPC( window=20 )
+    s.update( ct.iqcdata, ct.df )       # only rows newer than the last update are computed
+    s.new                               # rows added by the last update
+    s.new_alarms()                      # alarms not returned by a previous call, eg. to report each alarm once
+
+
+@author: Demis D. John
+Univ. of California Santa Barbara; Nanofabrication Facility
+"""
+
+####################################################
+# Module setup etc.
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import ASML_CT
+from ASML_CT import DEBUG
+
+####################################################
+
+
+def rolling_fit(x, y, window, min_periods=3):
+    """
+    Vectorized rolling least-squares line fit of `y` versus `x` over the last `window` points.
+
+    Parameters
+    ----------
+    x, y : pandas.Series
+        Data, NaN values are ignored. `x` should be roughly centred on zero, for numerical accuracy.
+
+    window : int
+        Number of points in each fit.
+
+    min_periods : int, defaults to 3
+        Minimum number of valid points for a fit.
+
+    Returns
+    -------
+    (slope, fit, stderr) : pandas.Series of the slope, the fitted line evaluated at each `x`, and the standard error of the slope.
+    """
+    valid = x.notna() & y.notna()
+    x, y = x.where(valid), y.where(valid)
+    roll = lambda v: v.rolling(window, min_periods=min_periods).sum()
+    n = valid.astype(float).rolling(window, min_periods=1).sum()
+    sx, sy, sxx, sxy, syy = roll(x), roll(y), roll(x*x), roll(x*y), roll(y*y)
+
+    den = n*sxx - sx*sx
+    slope = ( (n*sxy - sx*sy) / den ).replace( [np.inf, -np.inf], np.nan )
+    fit = sy/n + slope*(x - sx/n)
+
+    # residual sum of squares, from the centred sums
+    sse = ( (syy - sy*sy/n) - slope*(sxy - sx*sy/n) ).clip(lower=0)
+    stderr = np.sqrt(  ( sse/(n-2) ) / ( den/n )  ).replace( [np.inf, -np.inf], np.nan )
+    return slope, fit, stderr
+#end rolling_fit()
+
+
+def cusum(y, s0=0.0):
+    """
+    One-sided tabular CUSUM, S[i] = max(0, S[i-1] + y[i]), starting from S = s0.
+    Vectorized with the cumulative minimum of the running sum, instead of a Python loop.
+    """
+    C = s0 + np.cumsum(y)
+    return C - np.minimum( np.minimum.accumulate(C), 0.0 )
+#end cusum()
+
+
+class ASML_SPC:
+    """
+    Statistical Process Control of IQC focus data, updated incrementally.
+
+    ASML_SPC( column="IQCfoc", window=20, min_periods=5, target=None, limits=None,
+              ewma_lambda=0.2, ewma_L=3.0, cusum_k=0.5, cusum_h=5.0,
+              trendwindow=10, horizon=7.0, trendspan=0.5, trend_t=3.0,
+              temperatures=["Tlens", "Tws", "Tair"], tolerance=datetime.timedelta(hours=1) )
+
+    Arguments
+    ---------
+    column : string, defaults to "IQCfoc"
+        IQC data column to monitor, eg. "IQCfocMC".
+
+    window : int, defaults to 20
+        Number of previous points used for the rolling centre line & control limits.
+
+    min_periods : int, defaults to 5
+        Minimum number of previous points before control limits are computed.
+
+    target : float, optional
+        Fixed reference focus for EWMA & CUSUM. Defaults to None, which uses the rolling centre line CL, 
+        so a stable process with a constant offset does not alarm. 
+        Drifts towards the edge of `limits` are caught by DriftAlarm.
+
+    limits : (min, max) tuple, defaults to ASML_CT.IQClimits
+        Acceptable focus range (nm).
+
+    ewma_lambda, ewma_L : float, default to 0.2 & 3.0
+        EWMA weight of the newest point, and width of the EWMA limits in sigma.
+
+    cusum_k, cusum_h : float, default to 0.5 & 5.0
+        CUSUM slack and decision interval, in sigma.
+
+    trendwindow : int, defaults to 10
+        Number of points in the rolling trend fits versus time and temperature.
+        The trend versus time is only computed once `trendwindow` points are available.
+
+    horizon : float, defaults to 7.0
+        Days ahead to project the focus trend, for DriftAlarm.
+
+    trendspan : float, defaults to 0.5
+        Minimum time covered by the `trendwindow` points of the trend fit, as a fraction of `horizon`.
+        Trends fitted over a shorter time are not projected, eg. for hourly IQC measurements.
+
+    trend_t : float, defaults to 3.0
+        Minimum t-statistic (slope / standard error) of the trend, for it to be projected.
+
+    temperatures : list of strings
+        CT data columns to match to each IQC measurement & regress the focus against.
+
+    tolerance : datetime.timedelta, defaults to 1 hour
+        Max. time between an IQC measurement and the matched CT data.
+
+
+    See help(ASML_SPC) (the module) for the columns of the result table.
+    """
+
+    def __init__(self, column="IQCfoc", window=20, min_periods=5, target=None, limits=None, ewma_lambda=0.2, ewma_L=3.0, cusum_k=0.5, cusum_h=5.0, trendwindow=10, horizon=7.0, trendspan=0.5, trend_t=3.0, temperatures=["Tlens", "Tws", "Tair"], tolerance=datetime.timedelta(hours=1) ):
+        """ see help(ASML_SPC) for constructor info"""
+        self.column = column
+        self.window = window
+        self.min_periods = min_periods
+        self.limits = ASML_CT.IQClimits if limits is None else limits
+        self.target = target
+        self.ewma_lambda = ewma_lambda
+        self.ewma_L = ewma_L
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.trendwindow = trendwindow
+        self.horizon = horizon
+        self.trendspan = trendspan
+        self.trend_t = trend_t
+        self.temperatures = list(temperatures)
+        self.tolerance = tolerance
+
+        # previous rows needed to recompute the rolling windows & rules of new rows
+        self.lookback = max(self.window + 8, self.trendwindow)
+        self._reported = set()    # (DateTime, value) of alarms returned by new_alarms(), kept across reset()
+        self.reset()
+    #end __init__()
+
+
+    def reset(self):
+        """ Forget all computed data, the next update() recomputes the full history."""
+        self.table = None
+        self.new = None
+        self._ctend = None    # last CT DateTime matched to the table
+    #end reset()
+
+
+    def update(self, iqcdata, ctdata=None):
+        """
+        Compute SPC data for IQC measurements newer than the last update.
+
+        Parameters
+        ----------
+        iqcdata : pandas.DataFrame
+            All IQC data, eg. ASML_CT.iqcdata. Need not be sorted.
+            If rows older than the last update were added, removed or changed, the full history is recomputed.
+
+        ctdata : pandas.DataFrame, optional
+            CT data sorted by DateTime, eg. ASML_CT.df, for the temperature regression.
+            Earlier rows without matching CT data yet are matched again, eg. when the CT data arrives after the QICC file.
+
+        Returns
+        -------
+        The full SPC table, also stored in ASML_SPC.table. The rows added by this update are in ASML_SPC.new
+        """
+        iqcdata = iqcdata.dropna( subset=["DateTime", self.column] )
+
+        state = None
+        if (self.table is not None) and len(self.table):
+            isnew = iqcdata["DateTime"] > self.table["DateTime"].iloc[-1]
+            if self._unchanged( iqcdata[~isnew] ):
+                state = self.table.iloc[-1]
+                iqcdata = iqcdata[isnew]
+            else:
+                if DEBUG(): print("ASML_SPC: older IQC data changed, recomputing all.")
+                self.reset()
+        #end if(table)
+
+        new = iqcdata.sort_values("DateTime", kind="stable")[ ASML_CT.IQC_COLUMNS ]
+        if state is None:
+            context = new.iloc[:0]
+        else:
+            context = self.table.iloc[ -self.lookback: ][ ASML_CT.IQC_COLUMNS ]
+        chunk = pd.concat( [context, new], ignore_index=True )
+
+        self.new = self._compute( chunk, len(context), ctdata, state )
+        if state is None:
+            self.table = self.new
+        else:
+            self.table = pd.concat( [self.table, self.new], ignore_index=True )
+            self._fill_temperatures(ctdata)
+        if (ctdata is not None) and len(ctdata): self._ctend = pd.to_datetime( ctdata["DateTime"] ).max()
+        if DEBUG(): print("ASML_SPC: %i new rows, %i alarms."%( len(self.new), self.new["Alarm"].sum() ) )
+        return self.table
+    #end update()
+
+
+    def _unchanged(self, old):
+        """ Whether the IQC rows `old` are the same as those already in ASML_SPC.table, in any order."""
+        if len(old) != len(self.table): return False
+        keys = ["DateTime", self.column]
+        old = old[ ASML_CT.IQC_COLUMNS ].sort_values(keys, kind="stable")
+        known = self.table[ ASML_CT.IQC_COLUMNS ].sort_values(keys, kind="stable")
+        if not np.array_equal( pd.to_datetime(old["DateTime"]).to_numpy(), pd.to_datetime(known["DateTime"]).to_numpy() ): return False
+        for c in ASML_CT.IQC_COLUMNS[1:]:
+            if not np.array_equal( old[c].to_numpy(dtype=float), known[c].to_numpy(dtype=float), equal_nan=True ): return False
+        return True
+    #end _unchanged()
+
+
+    def _match_temperatures(self, datetimes, ctdata):
+        """ Return the CT temperatures nearest to each of `datetimes` (within `tolerance`), as a DataFrame with a RangeIndex."""
+        if (ctdata is None) or not len(ctdata) or not len(datetimes):
+            return pd.DataFrame( { T: np.full(len(datetimes), np.nan) for T in self.temperatures } )
+        return pd.merge_asof(
+            pd.DataFrame( {"DateTime": pd.to_datetime(datetimes).to_numpy()} ),
+            pd.DataFrame( {"DateTime": pd.to_datetime(ctdata["DateTime"]), **{ T: ctdata[T].to_numpy() for T in self.temperatures }} ),
+            on="DateTime", direction="nearest", tolerance=pd.Timedelta(self.tolerance) )
+    #end _match_temperatures()
+
+
+    def _fill_temperatures(self, ctdata):
+        """
+        Match CT temperatures again for rows of ASML_SPC.table computed before the CT data covering them was loaded:
+        rows without temperatures, and rows within `tolerance` of the end of the previous CT data.
+        Then recompute the temperature regressions from the first changed row.
+        """
+        if (ctdata is None) or not len(ctdata): return
+        redo = self.table[ self.temperatures ].isna().any(axis=1)
+        if self._ctend is not None:
+            redo |= self.table["DateTime"] >= self._ctend - pd.Timedelta(self.tolerance)
+        rows = np.flatnonzero( redo.to_numpy() )
+        if not len(rows): return
+        temps = self._match_temperatures( self.table["DateTime"].iloc[rows], ctdata )
+
+        s = self.table[self.column].astype(float)
+        for T in self.temperatures:
+            old, new = self.table[T].iloc[rows].to_numpy(dtype=float), temps[T].to_numpy(dtype=float)
+            changed = ~np.isnan(new) & ~( old == new )
+            if not changed.any(): continue
+            self.table.iloc[ rows[changed], self.table.columns.get_loc(T) ] = new[changed]
+
+            # the regression of each row uses the previous `trendwindow` rows
+            first = rows[changed][0]
+            start = max( 0, first - self.trendwindow + 1 )
+            x = self.table[T].iloc[start:]
+            slope = rolling_fit( x - x.mean(), s.iloc[start:], self.trendwindow )[0]
+            self.table.iloc[ first:, self.table.columns.get_loc("dFoc_d"+T) ] = slope.iloc[first-start:].to_numpy()
+        #end for(temperatures)
+    #end _fill_temperatures()
+
+
+    def alarms(self):
+        """ Return the rows of ASML_SPC.table with any alarm."""
+        return self.table[ self.table["Alarm"] ]
+    #end alarms()
+
+
+    def new_alarms(self):
+        """
+        Return the alarm rows that no previous call to new_alarms() returned, eg. to report each alarm only once.
+        Only rows computed by the last update() are checked, and alarms already returned are not repeated 
+        after a full recompute of the history.
+        """
+        if self.new is None: return pd.DataFrame()
+        alarms = self.new[ self.new["Alarm"] ]
+        keys = list( zip( alarms["DateTime"], alarms[self.column] ) )
+        isnew = np.array( [ not k in self._reported  for k in keys ], dtype=bool )
+        self._reported.update(keys)
+        return alarms[isnew]
+    #end new_alarms()
+
+
+    def _compute(self, chunk, ncontext, ctdata, state):
+        """
+        Compute the SPC columns of `chunk`, returning only the rows after the first `ncontext` (already computed) rows.
+        `state` is the last row already computed, to continue EWMA & CUSUM from, or None.
+        """
+        out = chunk.copy()
+        s = chunk[self.column].astype(float)
+        lo, hi = self.limits
+
+        ## Rolling control limits, from the previous points only
+        prior = s.shift(1).rolling( self.window, min_periods=self.min_periods )
+        out["CL"] = prior.mean()
+        out["Sigma"] = prior.std()
+        out["UCL"] = out["CL"] + 3*out["Sigma"]
+        out["LCL"] = out["CL"] - 3*out["Sigma"]
+        z = (s - out["CL"]) / out["Sigma"]
+        out["Z"] = z
+
+        ## Western Electric & Nelson rules
+        count = lambda cond, n: cond.astype(float).rolling(n).sum()
+        out["WE1"] = z.abs() > 3
+        out["WE2"] = ( count(z > 2, 3) >= 2 ) | ( count(z < -2, 3) >= 2 )
+        out["WE3"] = ( count(z > 1, 5) >= 4 ) | ( count(z < -1, 5) >= 4 )
+        out["WE4"] = ( count(z > 0, 8) == 8 ) | ( count(z < 0, 8) == 8 )
+        d = s.diff()
+        out["Trend6"] = ( count(d > 0, 5) == 5 ) | ( count(d < 0, 5) == 5 )
+
+        ## Trend versus time, projected `horizon` days ahead
+        # only from a full window, covering enough time, with a significant slope
+        t = ( chunk["DateTime"] - chunk["DateTime"].iloc[0] ).dt.total_seconds() / 86400.0 if len(chunk) else s
+        slope, fit, stderr = rolling_fit( t, s, self.trendwindow, min_periods=self.trendwindow )
+        span = t.rolling(self.trendwindow).max() - t.rolling(self.trendwindow).min()
+        significant = ( span >= self.trendspan*self.horizon ) & ( slope.abs() >= self.trend_t*stderr )
+        out["Slope"] = slope
+        out["ProjFoc"] = ( fit + slope*self.horizon ).where(significant)
+
+        ## Trend versus CT temperatures at the time of each IQC measurement
+        temps = self._match_temperatures( chunk["DateTime"], ctdata )
+        for T in self.temperatures:
+            out[T] = temps[T].to_numpy(dtype=float)
+            out["dFoc_d"+T] = rolling_fit( out[T] - out[T].mean(), s, self.trendwindow )[0]
+        #end for(temperatures)
+
+        out = out.iloc[ncontext:].reset_index(drop=True)
+        s = s.iloc[ncontext:].reset_index(drop=True)
+
+        ## EWMA, continued from the previous row
+        lam = self.ewma_lambda
+        ref = out["CL"] if self.target is None else pd.Series( self.target, index=out.index, dtype=float )
+        if state is not None:
+            prev = state["EWMA"]
+        else:
+            prev = s.iloc[0] if (self.target is None and len(s)) else self.target
+        out["EWMA"] = pd.concat( [pd.Series([prev]), s], ignore_index=True ).ewm( alpha=lam, adjust=False ).mean().iloc[1:].to_numpy()
+        width = self.ewma_L * out["Sigma"] * np.sqrt( lam/(2-lam) )
+        out["EWMA_UCL"] = ref + width
+        out["EWMA_LCL"] = ref - width
+
+        ## CUSUM, in sigma, continued from the previous row
+        y = np.nan_to_num(  ( (s - ref) / out["Sigma"] ).to_numpy(dtype=float), nan=0.0, posinf=0.0, neginf=0.0  )
+        out["CUSUMpos"] = cusum( y - self.cusum_k, 0.0 if state is None else state["CUSUMpos"] )
+        out["CUSUMneg"] = cusum( -y - self.cusum_k, 0.0 if state is None else state["CUSUMneg"] )
+
+        ## Alarms
+        out["EWMAalarm"] = ( out["EWMA"] > out["EWMA_UCL"] ) | ( out["EWMA"] < out["EWMA_LCL"] )
+        out["CUSUMalarm"] = ( out["CUSUMpos"] > self.cusum_h ) | ( out["CUSUMneg"] > self.cusum_h )
+        inlimits = s.between(lo, hi)
+        out["DriftAlarm"] = inlimits & ( (out["ProjFoc"] < lo) | (out["ProjFoc"] > hi) )
+        out["OutOfLimits"] = ~inlimits
+        out["Alarm"] = out[ ["WE1", "WE2", "WE3", "WE4", "Trend6", "EWMAalarm", "CUSUMalarm", "DriftAlarm", "OutOfLimits"] ].any(axis=1)
+
+        return out
+    #end _compute()
+
+#end class(ASML_SPC)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Module ASML_Server
+
+Small local HTTP dashboard for ASML CT/IQC data, using only the Python standard library.
+Serves JSON time-window queries over `ASML_CT.df` / `ASML_CT.iqcdata`, and PNG renders of `ASML_CT.plot()`
+for any date range. Responses are decimated, so they stay small for long ranges, and kept in an LRU cache
+keyed by (window, options, data version), so repeated dashboard loads don't re-plot.
+
+URLs
+----
+/                   HTML page showing the plot, with a date range form.
+/plot.png           PNG of ASML_CT.plot().
+/ct.json            CT data as JSON records.
+/iqc.json           IQC data as JSON records.
+
+Query arguments (all optional):
+    start, end      ISO date or date+time, eg. `2021-07-01` or `2021-07-01T12:00`. Defaults to all data.
+    points          Max. number of data rows per response, defaults to ASML_Server.points
+    columns         (JSON only) comma-separated CT columns, eg. `Tlens,Tws`
+    PlotPressure, PlotSupplyGas, PlotTCU, PlotFocCorrection, PlotFocMC, SPC    (PNG only) 1 or 0
+    WS_ymin, WS_ymax                                                       (PNG only) float
+
+Examples
+--------
+From the command line, loading the last 30 days and following new files with ASML_Watch:
+    python3 ASML_Server.py "/path/to/DataGrove logs (CT and ICQ)/" --days 30 --watch --port 8000
+then open http://localhost:8000/?start=2021-07-01
+
+From Python, with an already-analyzed ASML_CT object:
+    import ASML_Server
+    ASML_Server.ASML_Server( ct ).serve( port=8000 )
+
+
+@author: Demis D. John
+Univ. of California Santa Barbara; Nanofabrication Facility
+"""
+
+####################################################
+# Module setup etc.
+
+import collections
+import datetime
+import html
+import http.server
+import io
+import threading
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+import ASML_CT
+from ASML_CT import DEBUG
+
+####################################################
+
+
+# CT columns drawn by ASML_CT.plot(), used for decimating plot data
+PLOT_COLUMNS = ["Tlens", "Tws", "Tair", "Ttcu", "Plens", "Pairin", "Pgas"]
+
+# ASML_CT.plot() options accepted as query arguments, and their types
+PLOT_OPTIONS = {
+    "PlotPressure": bool, "PlotSupplyGas": bool, "PlotTCU": bool, "PlotFocCorrection": bool, "PlotFocMC": bool, "SPC": bool,
+    "WS_ymin": float, "WS_ymax": float,
+    }
+
+
+def decimate(df, points=2000, columns=None):
+    """
+    Reduce a DataFrame to at most `points` rows, keeping the min. & max. rows of each numeric column
+    within evenly-spaced bins, so spikes are still visible in plots of long time ranges.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Data, sorted by DateTime.
+
+    points : int, defaults to 2000
+        Max. number of rows to return. None returns `df` unchanged.
+
+    columns : list of strings, optional
+        Columns whose extremes should be kept, defaults to all numeric columns.
+
+    Returns
+    -------
+    Decimated DataFrame, in the original order.
+    """
+    n = len(df)
+    if (points is None) or (n <= points): return df
+
+    if columns is None: columns = df.columns
+    numeric = [ c for c in columns if c in df and pd.api.types.is_numeric_dtype(df[c]) ]
+    if not numeric:
+        return df.iloc[ np.linspace(0, n-1, points).astype(int) ]
+
+    # each bin keeps up to 2 rows per column: the rows of its min. & max. values, ignoring NaN
+    nbins = max( points // (2*len(numeric)), 1 )
+    bins = np.arange(n) * nbins // n
+    keep = []
+    for c in numeric:
+        vals = df[c].to_numpy(dtype=float)
+        idx = np.nonzero( ~np.isnan(vals) )[0]
+        if not len(idx): continue
+        order = np.lexsort(  ( vals[idx], bins[idx] )  )     # sort by bin, then value
+        b = bins[idx][order]
+        first = np.r_[ 0, np.nonzero( np.diff(b) )[0] + 1 ]
+        last = np.r_[ first[1:] - 1, len(b) - 1 ]
+        keep.append( idx[ order[first] ] )
+        keep.append( idx[ order[last] ] )
+    #end for(numeric)
+    if not keep:
+        return df.iloc[ np.linspace(0, n-1, points).astype(int) ]
+    keep = np.unique( np.concatenate(keep) )
+    return df.iloc[keep]
+#end decimate()
+
+
+class LRUCache:
+    """
+    Thread-safe Least-Recently-Used cache.
+
+    LRUCache( maxsize=64 )
+
+    Use `LRUCache.get(key, compute)`, which calls `compute()` only if `key` is not cached yet.
+    """
+
+    def __init__(self, maxsize=64):
+        """ see help(LRUCache) for constructor info"""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+    #end __init__()
+
+    def get(self, key, compute):
+        """ Return the cached value for `key`, or compute, store & return it."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        #end with(lock)
+
+        value = compute()   # outside the lock, so other requests aren't blocked
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        #end with(lock)
+        return value
+    #end get()
+
+    def clear(self):
+        """ Remove all cached items."""
+        with self._lock:
+            self._items.clear()
+    #end clear()
+
+#end class(LRUCache)
+
+
+class ASML_Server:
+    """
+    HTTP dashboard serving CT/IQC data and plots from an ASML_CT object.
+
+    ASML_Server( ct, points=2000, cachesize=64 )
+
+    Arguments
+    ---------
+    ct : ASML_CT object
+        Analyzed CT data, optionally with IQC data. May be updated while serving, eg. by ASML_Watch,
+        cached responses are invalidated through `ASML_CT.data_version`.
+
+    points : int, defaults to 2000
+        Default max. number of data rows in a response (see `decimate()`).
+
+    cachesize : int, defaults to 64
+        Number of JSON & PNG responses kept in the cache.
+    """
+
+    def __init__(self, ct, points=2000, cachesize=64):
+        """ see help(ASML_Server) for constructor info"""
+        self.ct = ct
+        self.points = points
+        self.cache = LRUCache(cachesize)
+        self._plotlock = threading.Lock()    # one render at a time, renders are CPU-bound
+    #end __init__()
+
+
+    def ct_window(self, start=None, end=None):
+        """ Return CT data between `start` and `end` (datetime.datetime or None), inclusive."""
+        data = self.ct.df
+        # data is sorted by DateTime, so use a binary search instead of a boolean mask
+        i0 = 0 if start is None else data["DateTime"].searchsorted(start, side="left")
+        i1 = len(data) if end is None else data["DateTime"].searchsorted(end, side="right")
+        return data.iloc[i0:i1]
+    #end ct_window()
+
+
+    def iqc_window(self, start=None, end=None):
+        """ Return IQC data between `start` and `end` (datetime.datetime or None), inclusive."""
+        iqcdata = getattr(self.ct, "iqcdata", None)
+        if iqcdata is None: return pd.DataFrame( columns=ASML_CT.IQC_COLUMNS )
+        if start is not None: iqcdata = iqcdata[ iqcdata["DateTime"] >= start ]
+        if end is not None: iqcdata = iqcdata[ iqcdata["DateTime"] <= end ]
+        return iqcdata.sort_values("DateTime")
+    #end iqc_window()
+
+
+    def query(self, kind, start=None, end=None, points=None, columns=None):
+        """
+        Return JSON (bytes) of the CT (`kind="ct"`) or IQC (`kind="iqc"`) data in a time window.
+        """
+        if points is None: points = self.points
+        key = ( kind, start, end, points, tuple(columns or ()), self.ct.data_version )
+
+        def compute():
+            if kind == "ct":
+                data = self.ct_window(start, end)
+                if columns: data = data[ ["DateTime", *columns] ]
+            else:
+                data = self.iqc_window(start, end)
+            data = decimate(data, points)
+            return data.to_json( orient="records", date_format="iso" ).encode()
+        #end compute()
+
+        return self.cache.get( key, compute )
+    #end query()
+
+
+    def render(self, start=None, end=None, points=None, options=dict()):
+        """
+        Return PNG (bytes) of `ASML_CT.plot()` for a time window, or None if there is no CT data in the window.
+        `options` are passed to ASML_CT.plot().
+        """
+        if points is None: points = self.points
+        key = ( "png", start, end, points, tuple(sorted(options.items())), self.ct.data_version )
+
+        def compute():
+            data = self.ct_window(start, end)
+            if not len(data): return None
+            data = decimate(data, points, PLOT_COLUMNS)
+            with self._plotlock:
+                # standalone Figure, rendered with Agg: handler threads never touch pyplot or a GUI backend
+                fig = self.ct.plot( data=data, show=False, **options )
+                buf = io.BytesIO()
+                fig.savefig( buf, format="png" )
+            return buf.getvalue()
+        #end compute()
+
+        return self.cache.get( key, compute )
+    #end render()
+
+
+    def page(self, querystring=""):
+        """ Return the HTML dashboard page (bytes), showing the plot for the given query string."""
+        args = urllib.parse.parse_qs(querystring)
+        start = html.escape( args.get("start", [""])[0] )
+        end = html.escape( args.get("end", [""])[0] )
+        qs = html.escape(querystring)
+        return (
+            "<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>ASML CT/IQC</title></head><body>\n"
+            "<form action='/' method='get'>\n"
+            "Start: <input name='start' value='%s' placeholder='2021-07-01'>\n"
+            "End: <input name='end' value='%s' placeholder='2021-07-26T12:00'>\n"
+            "<input type='submit' value='Plot'>\n"
+            "</form>\n"
+            "<p><a href='/ct.json?%s'>CT data (JSON)</a> | <a href='/iqc.json?%s'>IQC data (JSON)</a></p>\n"
+            "<img src='/plot.png?%s' alt='No CT data in this window'>\n"
+            "</body></html>\n" % (start, end, qs, qs, qs)
+            ).encode()
+    #end page()
+
+
+    def serve(self, host="127.0.0.1", port=8000):
+        """ Serve the dashboard until interrupted with Ctrl-C."""
+        httpd = http.server.ThreadingHTTPServer( (host, port), _Handler )
+        httpd.dashboard = self
+        print("Serving on http://%s:%i/"%(host, port) )
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopped.")
+        finally:
+            httpd.server_close()
+    #end serve()
+
+#end class(ASML_Server)
+
+
+def _parse_time(s):
+    """ Parse an ISO date or date+time query argument, or return None if empty."""
+    if not s: return None
+    return datetime.datetime.fromisoformat(s)
+#end _parse_time()
+
+
+def _parse_bool(s):
+    """ Parse a boolean query argument, eg. `1`, `true`, `0`, `false`."""
+    return s.lower() in ("1", "true", "yes", "on")
+#end _parse_bool()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """ Request handler for ASML_Server, the ASML_Server object is `self.server.dashboard`."""
+
+    def do_GET(self):
+        dashboard = self.server.dashboard
+        url = urllib.parse.urlsplit(self.path)
+        args = { k: v[-1]  for k, v in urllib.parse.parse_qs(url.query).items() }
+
+        try:
+            start, end = _parse_time( args.get("start") ), _parse_time( args.get("end") )
+            points = int(args["points"]) if args.get("points") else None
+            columns = [ c for c in args.get("columns", "").split(",") if c ]
+            for c in columns:
+                if not c in ASML_CT.CT_COLUMNS: raise ValueError("Unknown column `%s`"%(c))
+            options = {}
+            for name, typ in PLOT_OPTIONS.items():
+                if args.get(name):
+                    options[name] = _parse_bool(args[name]) if typ is bool else typ(args[name])
+            #end for(PLOT_OPTIONS)
+        except ValueError as e:
+            self._send( 400, "text/plain", ("Bad request: %s\n"%(e)).encode() )
+            return
+        #end try(arguments)
+
+        try:
+            if url.path == "/":
+                self._send( 200, "text/html; charset=utf-8", dashboard.page(url.query) )
+            elif url.path == "/ct.json":
+                self._send( 200, "application/json", dashboard.query("ct", start, end, points, columns) )
+            elif url.path == "/iqc.json":
+                self._send( 200, "application/json", dashboard.query("iqc", start, end, points) )
+            elif url.path == "/plot.png":
+                png = dashboard.render(start, end, points, options)
+                if png is None:
+                    self._send( 404, "text/plain", b"No CT data in this window.\n" )
+                else:
+                    self._send( 200, "image/png", png )
+            else:
+                self._send( 404, "text/plain", b"Not found.\n" )
+        except Exception as e:
+            print("*** Error while serving `%s`: %r"%(self.path, e))
+            self._send( 500, "text/plain", ("Error: %r\n"%(e)).encode() )
+        #end try(routes)
+    #end do_GET()
+
+    def _send(self, code, contenttype, body):
+        self.send_response(code)
+        self.send_header("Content-Type", contenttype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    #end _send()
+
+    def log_message(self, format, *args):
+        if DEBUG(): http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
+    #end log_message()
+
+#end class(_Handler)
+
+
+if __name__ == "__main__":
+    import argparse
+    import ASML_Watch
+
+    parser = argparse.ArgumentParser( description="Serve ASML CT/IQC data and plots over HTTP." )
+    parser.add_argument( "folder", help="DataGrove folder containing CT & QICC files" )
+    parser.add_argument( "--days", type=int, default=None, help="load only files from the last DAYS days (default: all)" )
+    parser.add_argument( "--watch", action="store_true", help="keep loading new & changed files with ASML_Watch" )
+    parser.add_argument( "--host", default="127.0.0.1", help="address to listen on (default 127.0.0.1)" )
+    parser.add_argument( "--port", type=int, default=8000, help="port to listen on (default 8000)" )
+    parser.add_argument( "--points", type=int, default=2000, help="default max. data rows per response (default 2000)" )
+    args = parser.parse_args()
+
+    if args.watch:
+        watcher = ASML_Watch.ASML_Watch( args.folder, days=args.days, png=None )
+        threading.Thread( target=watcher.run, daemon=True ).start()
+        ct = watcher.ct
+    else:
+        mindate = None
+        if args.days is not None:
+            mindate = datetime.datetime.now() - datetime.timedelta( days = args.days )
+            mindate = datetime.datetime.combine( mindate.date() , datetime.time( 0,0,0 ) )  # set to midnight
+        snap = ASML_Watch.scan_folder( args.folder, mindate )
+        ct = ASML_CT.ASML_CT(  sorted( p for p, st in snap.items() if st[0] == "CT" )  )
+        ct.add_IQC_files(  sorted( p for p, st in snap.items() if st[0] == "IQC" )  )
+        ct.iqc_analyze()
+        ct.iqc_spc()    # for SPC=1, plotting only reads ASML_CT.spc
+    #end if(watch)
+
+    ASML_Server( ct, points=args.points ).serve( host=args.host, port=args.port )
+#end if(__main__)
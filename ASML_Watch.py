@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Module ASML_Watch
+
+Long-running "watch" mode, instead of re-running ASMLPlotTCData_v4.py from cron.
+Polls a DataGrove download folder, parses only new or changed CT (*.cur*, *.old*) and QICC.* files
+in a pool of worker processes, updates an ASML_CT object incrementally, and re-renders the plot
+to a fixed PNG file only when the plotted time window actually changed.
+Bursts of files are debounced, so they cause only one render.
+While the folder is unchanged (same modification time), each poll only checks the growing CT *.cur files,
+instead of every file in the folder.
+
+Examples
+--------
+From the command line:
+    python3 ASML_Watch.py "/path/to/DataGrove logs (CT and ICQ)/" --days 7 --png "ASML CT Temps - latest.png"
+
+From Python:
+    import ASML_Watch
+    w = ASML_Watch.ASML_Watch( "/path/to/DataGrove logs (CT and ICQ)/", days=7 )
+    w.run()     # blocks until Ctrl-C
+    w.ct.df     # the incrementally updated ASML_CT object
+
+
+@author: Demis D. John
+Univ. of California Santa Barbara; Nanofabrication Facility
+"""
+
+####################################################
+# Module setup etc.
+
+import asyncio
+import concurrent.futures
+import datetime
+import os
+import re
+import time
+import traceback
+
+import pandas as pd
+
+import ASML_CT
+from ASML_CT import DEBUG
+
+####################################################
+
+
+def classify(name):
+    """
+    Return the type of a DataGrove file from its filename: "IQC", "CT" or None (ignored).
+    """
+    if ASML_CT.QICC_PATTERN.match(name): return "IQC"
+    if name.startswith("QICC."): return None   # eg. the .tgs files
+    if ASML_CT.CT_PATTERN.search(name): return "CT"
+    return None
+#end classify()
+
+
+def scan_folder(folder, mindate=None):
+    """
+    List the CT & QICC files in a folder, with `os.scandir()`.
+
+    Parameters
+    ----------
+    folder : string
+        Path to the DataGrove folder.
+
+    mindate : datetime.datetime, optional
+        Ignore files created before this date, as in ASMLPlotTCData_v4.py.
+
+    Returns
+    -------
+    Dictionary { filepath : (type, size, mtime_ns) }, type being "CT" or "IQC".
+    """
+    if mindate is not None: mintime = mindate.timestamp()
+    snap = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            kind = classify(entry.name)
+            try:
+                if kind is None or not entry.is_file(): continue
+                st = entry.stat()
+            except FileNotFoundError:
+                continue    # removed since listing the folder
+            if (mindate is not None) and (st.st_ctime < mintime): continue
+            snap[entry.path] = (kind, st.st_size, st.st_mtime_ns)
+        #end for(entry)
+    #end with(scandir)
+    return snap
+#end scan_folder()
+
+
+def stat_files(paths):
+    """ Return { filepath : (size, mtime_ns) } for the files in `paths` that still exist."""
+    out = {}
+    for p in paths:
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            continue
+        out[p] = (st.st_size, st.st_mtime_ns)
+    #end for(paths)
+    return out
+#end stat_files()
+
+
+def parse_files(kind, paths):
+    """
+    Parse a chunk of CT or QICC files, in a worker process.
+    Returns a list of (filepath, result, error) tuples, where `result` is the output of
+    ASML_CT.parse_ct_file() or ASML_CT.parse_iqc_file(), and `error` is None or the error message.
+    """
+    parse = ASML_CT.parse_ct_file if kind == "CT" else ASML_CT.parse_iqc_file
+    out = []
+    for p in paths:
+        try:
+            out.append(  (p, parse(p), None)  )
+        except Exception as e:
+            out.append(  (p, None, repr(e))  )
+    #end for(paths)
+    return out
+#end parse_files()
+
+
+# CT files still being written to, whose size changes without changing the folder
+GROWING_PATTERN = re.compile(r"\.cur$")
+
+
+class ASML_Watch:
+    """
+    Watch a DataGrove folder and keep an ASML_CT object & plot up-to-date.
+
+    ASML_Watch( folder, days=7, interval=2.0, debounce=3.0, rescan=300.0, workers=None, png="ASML CT Temps - latest.png", plotargs=dict() )
+
+    Arguments
+    ---------
+    folder : string
+        Path to the DataGrove folder containing CT & QICC files.
+
+    days : int or None, defaults to 7
+        Plot (and load) only data since midnight `days` ago. None loads & plots everything.
+
+    interval : float, defaults to 2.0
+        Seconds between folder scans.
+
+    debounce : float, defaults to 3.0
+        Seconds without new file changes before parsing & rendering a batch of files.
+
+    rescan : float, defaults to 300.0
+        Seconds between full folder scans while the folder modification time is unchanged,
+        eg. to catch files re-written in place. Other polls only check the CT *.cur files.
+
+    workers : int, defaults to None
+        Number of parsing worker processes, None uses the number of CPUs.
+
+    png : string, defaults to "ASML CT Temps - latest.png"
+        File path of the rendered plot. Overwritten atomically on each render.
+        None only keeps ASML_Watch.ct up-to-date, without plotting.
+
+    plotargs : dictionary
+        Extra arguments to pass to `ASML_CT.plot()`, eg. dict(PlotPressure=True, WS_ymin=21.8)
+
+
+    The ASML_CT object is available as ASML_Watch.ct
+    """
+
+    # files parsed per worker task; QICC files are small, so batch them to limit per-task overhead
+    chunksize = 32
+
+    def __init__(self, folder, days=7, interval=2.0, debounce=3.0, rescan=300.0, workers=None, png="ASML CT Temps - latest.png", plotargs=dict() ):
+        """ see help(ASML_Watch) for constructor info"""
+        self.folder = folder
+        self.days = days
+        self.interval = interval
+        self.debounce = debounce
+        self.rescan = rescan
+        self.workers = workers
+        self.png = png
+        self.plotargs = dict(plotargs)
+
+        self.ct = ASML_CT.ASML_CT( [] )
+        self.ct.update_IQC_data( {} )   # start with empty IQC data, so the IQC axis is always plotted
+        self._snapshot = {}
+        self._folder_mtime = None
+        self._next_rescan = 0.0
+        self._growing = []
+        self._window_key = None
+        self.renders = 0
+    #end __init__()
+
+
+    def mindate(self):
+        """ Return the start of the plotted window, midnight `days` ago, or None for no limit."""
+        if self.days is None: return None
+        mindate = datetime.datetime.now() - datetime.timedelta( days = self.days )
+        return datetime.datetime.combine( mindate.date() , datetime.time( 0,0,0 ) )  # set to midnight
+    #end mindate()
+
+
+    def window(self):
+        """ Return the (CT, IQC) DataFrames visible in the plot."""
+        data = self.ct.df
+        mindate = self.mindate()
+        if mindate is not None:
+            data = data[  data['DateTime'] > mindate  ]
+
+        # same restriction of IQC data as in ASML_CT.plot()
+        iqcdata = self.ct.iqcdata
+        if len(data):
+            tempmin, tempmax = data.DateTime.min() , data.DateTime.max() + datetime.timedelta(hours=6)
+            iqcdata = iqcdata[  iqcdata.DateTime.between(tempmin, tempmax, inclusive="both")  ]
+        return data, iqcdata
+    #end window()
+
+
+    def window_key(self, data, iqcdata):
+        """ Cheap fingerprint of the visible data, to tell whether the plot needs re-rendering."""
+        return (
+            len(data), int( pd.util.hash_pandas_object(data, index=False).sum() ),
+            len(iqcdata), int( pd.util.hash_pandas_object(iqcdata, index=False).sum() ),
+            )
+    #end window_key()
+
+
+    def render(self, data):
+        """ Plot the visible window and save it to ASML_Watch.png."""
+        # standalone Figure, rendered with Agg: this runs in a worker thread, away from any GUI backend
+        fig = self.ct.plot( data=data, show=False, **self.plotargs )
+
+        # write to a temp. file and rename, so viewers never load a half-written PNG
+        root, ext = os.path.splitext(self.png)
+        tmpfile = root + ".tmp" + ext
+        fig.savefig( tmpfile )
+        os.replace( tmpfile, self.png )
+
+        self.renders += 1
+        print( datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "- Figure saved to: " + self.png )
+    #end render()
+
+
+    def scan(self):
+        """
+        Return the current { filepath : (type, size, mtime_ns) } of the folder, see `scan_folder()`.
+        The folder is only listed if its modification time changed, or every `rescan` seconds,
+        otherwise only the growing CT *.cur files of the previous scan are checked.
+        """
+        mtime = os.stat(self.folder).st_mtime_ns
+        now = time.time()
+        # a folder modified in the last seconds may change again within its mtime resolution (eg. network shares)
+        if (mtime != self._folder_mtime) or (now >= self._next_rescan) or (now - mtime/1e9 < 2.0):
+            snap = scan_folder( self.folder, self.mindate() )
+            self._folder_mtime = mtime
+            self._next_rescan = now + self.rescan
+            self._growing = [ p  for p, st in snap.items()  if st[0] == "CT" and GROWING_PATTERN.search(p) ]
+            return snap
+        #end if(folder changed)
+
+        current = stat_files(self._growing)
+        changed = { p: ( "CT", *current[p] )  for p in self._growing  if p in current and self._snapshot.get(p) != ( "CT", *current[p] ) }
+        if not changed and len(current) == len(self._growing): return self._snapshot
+
+        snap = dict(self._snapshot)
+        snap.update(changed)
+        for p in self._growing:
+            if not p in current: snap.pop(p, None)
+        return snap
+    #end scan()
+
+
+    async def _poll(self, queue):
+        """ Scan the folder every `interval` seconds, and queue new or changed files."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                snap = await loop.run_in_executor( None, self.scan )
+            except OSError as e:
+                # eg. folder temporarily unavailable (network share): try again at the next scan
+                print("*** Error while scanning folder: `%s`\n\t%r"%( self.folder, e ))
+            else:
+                changed = { p: st[0]  for p, st in snap.items()  if self._snapshot.get(p) != st }
+                self._snapshot = snap
+                if changed:
+                    if DEBUG(): print("Changed files:", list(changed))
+                    await queue.put(changed)
+            #end try(scan)
+            await asyncio.sleep(self.interval)
+        #end while
+    #end _poll()
+
+
+    async def _ingest(self, queue, pool):
+        """ Collect bursts of changed files from the queue, then parse & render them as one batch."""
+        while True:
+            batch = await queue.get()
+            # debounce: keep collecting until no new files arrive for `debounce` seconds
+            while True:
+                try:
+                    batch.update(   await asyncio.wait_for( queue.get(), self.debounce )   )
+                except asyncio.TimeoutError:
+                    break
+            #end while(debounce)
+            try:
+                await self._process(batch, pool)
+            except Exception:
+                # keep watching; the files of this batch are re-tried when they change again
+                print("*** Error while processing %i changed files:"%( len(batch) ))
+                traceback.print_exc()
+        #end while
+    #end _ingest()
+
+
+    async def _process(self, batch, pool):
+        """ Parse a batch of files in the worker pool, update ASML_Watch.ct, and render if needed."""
+        loop = asyncio.get_running_loop()
+
+        jobs = []
+        for kind in ("CT", "IQC"):
+            paths = sorted( p for p, k in batch.items() if k == kind )
+            for i in range(0, len(paths), self.chunksize):
+                jobs.append(  loop.run_in_executor( pool, parse_files, kind, paths[i:i+self.chunksize] )  )
+        #end for(kind)
+        results = await asyncio.gather( *jobs )
+
+        ctupdate, iqcupdate = {}, {}
+        for chunk in results:
+            for p, result, error in chunk:
+                if error is not None:
+                    # will be re-tried when the file changes again, eg. if it was still being written.
+                    print("*** Error while parsing file: `" + p +"`\n\t" + error + "\n\t File Skipped.")
+                elif batch[p] == "CT":
+                    Data, Dates, CurDate = result
+                    ctupdate[p] = (Data, Dates)
+                else:
+                    iqcupdate[p] = result
+            #end for(chunk)
+        #end for(results)
+
+        if ctupdate: self.ct.update_CT_data( ctupdate )
+        if iqcupdate: self.ct.update_IQC_data( iqcupdate )
+        if ctupdate or iqcupdate:
+            # incremental SPC, also matching new CT temperatures to earlier IQC measurements.
+            # Report drift & rule alarms of the new IQC measurements
+            self.ct.iqc_spc()
+            column = self.ct.spc_engine.column
+            for i, row in self.ct.spc_engine.new_alarms().iterrows():
+                print( "*** IQC SPC alarm:", row["DateTime"], "\t %s = %.1f nm"%( column, row[column] ) )
+        if DEBUG(): print("Parsed %i CT and %i IQC files."%( len(ctupdate), len(iqcupdate) ) )
+
+        data, iqcdata = self.window()
+        key = self.window_key(data, iqcdata)
+        if (self.png is not None) and len(data) and key != self._window_key:
+            await loop.run_in_executor( None, self.render, data )
+            self._window_key = key
+        elif DEBUG(): print("Plotted window unchanged, not re-rendering.")
+    #end _process()
+
+
+    async def watch(self):
+        """ Coroutine that watches the folder forever."""
+        queue = asyncio.Queue()
+        with concurrent.futures.ProcessPoolExecutor( self.workers ) as pool:
+            await asyncio.gather(  self._poll(queue), self._ingest(queue, pool)  )
+    #end watch()
+
+
+    def run(self):
+        """ Watch the folder until interrupted with Ctrl-C."""
+        print("Watching: `%s`"%(self.folder) )
+        try:
+            asyncio.run( self.watch() )
+        except KeyboardInterrupt:
+            print("Stopped.")
+    #end run()
+
+#end class(ASML_Watch)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser( description="Watch a DataGrove folder and re-plot ASML CT/IQC data when it changes." )
+    parser.add_argument( "folder", help="DataGrove folder containing CT & QICC files" )
+    parser.add_argument( "--days", type=int, default=7, help="plot data from the last DAYS days (default 7)" )
+    parser.add_argument( "--interval", type=float, default=2.0, help="seconds between folder scans (default 2)" )
+    parser.add_argument( "--debounce", type=float, default=3.0, help="seconds of quiet before re-plotting (default 3)" )
+    parser.add_argument( "--rescan", type=float, default=300.0, help="seconds between full folder scans while it is unchanged (default 300)" )
+    parser.add_argument( "--workers", type=int, default=None, help="number of parsing processes (default: number of CPUs)" )
+    parser.add_argument( "--png", default="ASML CT Temps - latest.png", help="output figure path" )
+    args = parser.parse_args()
+
+    ASML_Watch( args.folder, days=args.days, interval=args.interval, debounce=args.debounce, rescan=args.rescan, workers=args.workers, png=args.png ).run()
+#end if(__main__)
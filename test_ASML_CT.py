@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of reading QICC files from compressed files & archives in module ASML_CT, on synthetic QICC files.
+Run with `python -m pytest`
+"""
+
+import gzip
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import ASML_CT
+
+
+def qicc(i):
+    """ Text of a synthetic QICC file, with the date, time & focus at the columns read by ASML_CT.parse_iqc_file()."""
+    lines = [" "*80] * 40
+    lines[1] = " "*54 + "%02d/%02d/2021"%( 1 + i%12, 1 + i%28 ) + " "*7 + "%02d:%02d"%( i%24, i%60 ) + " "*4
+    lines[37] = " "*29 + "%9.1f"%( 100 + i%7 ) + " "*2 + "%9.1f"%( i%50 - 25 ) + " "*11
+    return "\n".join(lines) + "\n"
+
+
+def add_tar_member(tar, name, text):
+    data = text.encode()
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile( info, io.BytesIO(data) )
+
+
+@pytest.fixture
+def qiccfiles(tmp_path):
+    """ Plain, gzipped, zip & tar QICC files (11 in total), and archives without any QICC file."""
+    paths = []
+    for i in range(3):
+        p = tmp_path / ("QICC.%i"%i)
+        p.write_text( qicc(i) )
+        paths.append( str(p) )
+
+    p = tmp_path / "QICC.3.gz"
+    with gzip.open(p, "wt") as f: f.write( qicc(3) )
+    paths.append( str(p) )
+
+    p = tmp_path / "qicc.zip"
+    with zipfile.ZipFile(p, "w", zipfile.ZIP_DEFLATED) as z:
+        for i in range(4, 8): z.writestr( "logs/QICC.%i"%i, qicc(i) )
+        z.writestr( "logs/QICC.9.tgs", "ignored" )
+        z.writestr( "notes.txt", "ignored" )
+    paths.append( str(p) )
+
+    p = tmp_path / "qicc.tar.gz"
+    with tarfile.open(p, "w:gz") as tar:
+        for i in range(8, 11): add_tar_member( tar, "logs/QICC.%i"%i, qicc(i) )
+    paths.append( str(p) )
+
+    empty = []
+    p = tmp_path / "empty.zip"
+    with zipfile.ZipFile(p, "w") as z: z.writestr( "notes.txt", "ignored" )
+    empty.append( str(p) )
+    p = tmp_path / "empty.tar"
+    with tarfile.open(p, "w") as tar: add_tar_member( tar, "notes.txt", "ignored" )
+    empty.append( str(p) )
+
+    return paths, empty
+
+
+def iqc_analyze(paths, workers):
+    ct = ASML_CT.ASML_CT( [], workers=workers )
+    ct.add_IQC_files(paths)
+    return ct.iqc_analyze()
+
+
+@pytest.mark.parametrize( "workers", [1, 2, 3] )
+def test_iqc_files_and_archives(qiccfiles, workers):
+    paths, empty = qiccfiles
+    data = iqc_analyze( paths + empty, workers )
+    assert len(data) == 11
+    assert sorted( data["IQCfoc"] ) == sorted( float( i%50 - 25 ) for i in range(11) )
+    # same rows, in the same order, as parsing in this process
+    assert data.equals( iqc_analyze( paths + empty, 1 ) )
+
+
+@pytest.mark.parametrize( "workers", [1, 2] )
+def test_archives_without_qicc_files(qiccfiles, workers):
+    paths, empty = qiccfiles
+    assert len( iqc_analyze( empty, workers ) ) == 0
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of module ASML_SPC, on synthetic IQC focus data.
+Run with `python -m pytest`
+"""
+
+import numpy as np
+import pandas as pd
+
+import ASML_SPC
+
+
+def iqcdata(foc, freq="12h"):
+    """ IQC DataFrame, one measurement every 12 hours by default."""
+    return pd.DataFrame( {
+        "DateTime": pd.date_range("2021-01-01", periods=len(foc), freq=freq),
+        "IQCfoc": foc,
+        "IQCfocMC": 0.0,
+        } )
+
+
+def test_stationary_in_spec_has_few_alarms():
+    # stable process, offset from 0 nm but far inside IQClimits
+    rng = np.random.default_rng(0)
+    table = ASML_SPC.ASML_SPC().update(  iqcdata( 10 + 3*rng.standard_normal(500) )  )
+    assert table["EWMAalarm"].mean() < 0.02
+    assert table["CUSUMalarm"].mean() < 0.05
+    assert not table["DriftAlarm"].any()
+    assert not table["OutOfLimits"].any()
+    assert table["Alarm"].mean() < 0.10
+
+
+def test_no_drift_alarm_at_sub_daily_cadence():
+    # short fits of noise must not be projected a week ahead
+    rng = np.random.default_rng(4)
+    for freq in ("1h", "4h"):
+        table = ASML_SPC.ASML_SPC().update(  iqcdata( 10 + 3*rng.standard_normal(500), freq )  )
+        assert not table["DriftAlarm"].any()
+        assert table["ProjFoc"].iloc[:10].isna().all()
+        assert table["Alarm"].mean() < 0.10
+
+
+def test_drift_alarms_before_leaving_limits():
+    rng = np.random.default_rng(1)
+    foc = 10 + 3*rng.standard_normal(500)
+    foc[300:] += np.linspace(0, 60, 200)    # drifts out of the +50 nm limit
+    table = ASML_SPC.ASML_SPC().update( iqcdata(foc) )
+    first_out = table.index[ table["OutOfLimits"] ].min()
+    assert table.loc[ 300:first_out-1, "DriftAlarm" ].any()
+    assert table.loc[ 300:first_out-1, "CUSUMalarm" ].any()
+
+
+def test_incremental_update_matches_full():
+    rng = np.random.default_rng(2)
+    data = iqcdata( 10 + 3*rng.standard_normal(300) )
+    full = ASML_SPC.ASML_SPC().update(data)
+    s = ASML_SPC.ASML_SPC()
+    for n in range(37, len(data) + 37, 37):
+        s.update( data.iloc[:n] )
+    pd.testing.assert_frame_equal( s.table, full )
+
+
+def test_new_alarms_not_repeated_after_recompute():
+    rng = np.random.default_rng(3)
+    foc = 10 + 3*rng.standard_normal(200)
+    foc[150] = 45    # one outlier
+    data = iqcdata(foc)
+    s = ASML_SPC.ASML_SPC()
+    s.update( data.iloc[:160].drop(index=100) )
+    first = s.new_alarms()
+    assert len(first) and (first["IQCfoc"] == 45).any()
+
+    # a late QICC file older than the last update: the full history is recomputed
+    s.update(data)
+    assert len(s.new) == len(data)
+    again = s.new_alarms()
+    assert not (again["IQCfoc"] == 45).any()
+
+
+def test_changed_older_rows_are_recomputed():
+    rng = np.random.default_rng(5)
+    data = iqcdata( 10 + 3*rng.standard_normal(100) )
+    s = ASML_SPC.ASML_SPC()
+    s.update(data)
+
+    # a re-parsed QICC file replaced the value of an older row
+    changed = data.copy()
+    changed.loc[30, "IQCfoc"] = 80
+    table = s.update(changed)
+    assert table.loc[30, "IQCfoc"] == 80 and table.loc[30, "OutOfLimits"]
+    pd.testing.assert_frame_equal( table, ASML_SPC.ASML_SPC().update(changed) )
+
+    # one older row removed and another added: same number of rows
+    swapped = changed.drop(index=40)
+    swapped = pd.concat( [swapped, iqcdata([12.0]).assign( DateTime=data["DateTime"][50] + pd.Timedelta(hours=1) )], ignore_index=True )
+    table = s.update(swapped)
+    pd.testing.assert_frame_equal( table, ASML_SPC.ASML_SPC().update(swapped) )
+
+
+def test_temperatures_filled_when_ct_data_arrives_later():
+    rng = np.random.default_rng(6)
+    data = iqcdata( 10 + 3*rng.standard_normal(120) )
+    times = pd.date_range( data["DateTime"].iloc[0], data["DateTime"].iloc[-1], freq="10min" )
+    ctdata = pd.DataFrame( { "DateTime": times,
+        **{ T: 22 + 0.01*rng.standard_normal(len(times)) for T in ("Tlens", "Tws", "Tair") } } )
+    full = ASML_SPC.ASML_SPC().update(data, ctdata)
+    assert full["Tlens"].notna().all()
+
+    # in watch mode, QICC files usually arrive before the CT data covering them
+    s = ASML_SPC.ASML_SPC()
+    for n in range(30, len(data) + 30, 30):
+        s.update( data.iloc[:n], ctdata[ ctdata["DateTime"] < data["DateTime"].iloc[n-10] ] )
+    assert s.table["Tlens"].isna().any()
+    s.update(data, ctdata)    # CT data only
+    pd.testing.assert_frame_equal( s.table, full )